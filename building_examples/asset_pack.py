@@ -0,0 +1,157 @@
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+import arcade
+
+""" Packs an asset directory into a single indexed archive, and serves
+resources straight out of a memory mapped copy of it.
+
+One file builds extract their bundled data to a temporary directory every time
+they start. So instead of bundling the assets the builders put one archive
+next to the executable, and the game maps it and reads it in place: nothing
+is extracted and nothing inside it is read until it is used.
+
+The archive is a small header, a JSON index of {relative path: [offset, size]}
+and the file contents one after another. mount() hooks arcade's resource
+resolver so ":<handle>:png/..." paths keep working: when a path is in the
+archive the resolver hands back a read only file object over the mapped bytes,
+which PIL reads directly without any copy to disk.
+
+Only arcade's texture loading goes through that resolver. arcade's loaders
+each import resolve by name and expect a path back, so sounds, fonts, tile
+maps and direct arcade.resources.resolve(":handle:...") calls can not be
+served from the archive. Keep those assets in a resource directory of their
+own, or read them with the resolver mount() returns.
+"""
+
+MAGIC = b"ASPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ALIGNMENT = 16
+
+
+def pack(directory, archive_path, exclude=()):
+    """ Pack every file under directory but the relative names in exclude,
+    such as the images a baked atlas already has.
+    """
+    directory = Path(directory)
+    exclude = set(exclude)
+    files = sorted(path for path in directory.rglob("*")
+                   if path.is_file() and path.relative_to(directory).as_posix() not in exclude)
+    names = [path.relative_to(directory).as_posix() for path in files]
+    sizes = [path.stat().st_size for path in files]
+
+    # The index stores absolute offsets, which depend on the size of the index
+    # itself. Offsets are padded to a fixed width so one pass is enough.
+    def build_index(data_start):
+        index, offset = {}, data_start
+        for name, size in zip(names, sizes):
+            index[name] = [f"{offset:012d}", size]
+            offset += size + (-size % ALIGNMENT)
+        return json.dumps(index).encode()
+
+    index_size = len(build_index(0))
+    data_start = HEADER.size + index_size
+    data_start += -data_start % ALIGNMENT
+    index = build_index(data_start)
+
+    with open(archive_path, "wb") as archive:
+        archive.write(HEADER.pack(MAGIC, VERSION, len(index)))
+        archive.write(index)
+        archive.write(b"\0" * (data_start - archive.tell()))
+        for path, size in zip(files, sizes):
+            archive.write(path.read_bytes())
+            archive.write(b"\0" * (-size % ALIGNMENT))
+
+
+class ArchiveMember(io.RawIOBase):
+    """ A read only file over a slice of the mapped archive. """
+
+    def __init__(self, name, data: memoryview):
+        super().__init__()
+        self.name = name
+        self.data = data
+        self.position = 0
+
+    def __str__(self):
+        return self.name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.data) - self.position)
+        buffer[:count] = self.data[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.data)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class AssetArchive:
+    def __init__(self, archive_path):
+        self.file = open(archive_path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        magic, version, index_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{archive_path} is not a version {VERSION} asset archive")
+
+        index = json.loads(bytes(self.view[HEADER.size:HEADER.size + index_size]))
+        self.index = {name: (int(offset), size) for name, (offset, size) in index.items()}
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def read(self, name) -> memoryview:
+        offset, size = self.index[name]
+        return self.view[offset:offset + size]
+
+    def open(self, name, resource_name=None) -> ArchiveMember:
+        return ArchiveMember(resource_name or name, self.read(name))
+
+
+def mount(handle, archive: AssetArchive):
+    """ Serve ":handle:..." resources from archive to arcade's texture
+    loading, anything it does not contain falls through to arcade's normal
+    resolver. Returns the resolver, for code that reads resources itself.
+    Other loaders are not hooked, see the module docstring.
+    """
+    prefix = f":{handle}:"
+    original = arcade.resources.resolve
+
+    def resolve(path, *args, **kwargs):
+        if isinstance(path, str) and path.startswith(prefix):
+            name = path[len(prefix):].lstrip("/")
+            if name in archive:
+                return archive.open(name, path)
+        return original(path, *args, **kwargs)
+
+    # The texture loaders import resolve by name, their module is the one to patch
+    arcade.texture.loading.resolve = resolve
+    return resolve
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "assets"
+    destination = sys.argv[2] if len(sys.argv) > 2 else "assets.pak"
+    pack(source, destination)
+    print(f"Packed {source} into {destination} ({os.path.getsize(destination)} bytes)")
@@ -0,0 +1,148 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import arcade
+import PIL.Image
+
+""" Bakes a directory of sprite images into a few atlas pages at build time.
+
+Loading hundreds of separate PNGs means hundreds of file opens and decodes
+when the game starts. The baker packs every image under a directory into one
+or a few atlas pages, using simple shelf packing, and writes an index of where
+each image ended up.
+
+At runtime a BakedAtlas decodes each page once and hands out regions of it as
+textures. The game asks it for textures explicitly, BakedAtlas.load_texture()
+returns the region for an image in the atlas and loads anything else as
+usual, so it can stand in for arcade.load_texture(). The images an atlas
+covers are left out of the packed archive, so code that loads one of them
+some other way will not find it.
+"""
+
+ATLAS_DIRECTORY = "atlas"
+INDEX_NAME = "atlas.json"
+PAGE_SIZE = 2048
+PADDING = 1
+IMAGE_SUFFIXES = (".png",)
+
+
+def shelf_pack(sizes, page_size, padding):
+    """ Place (width, height) rectangles on pages, tallest first. Returns
+    {index: (page, x, y)}.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+    placements = {}
+    page, x, y, shelf_height = 0, 0, 0, 0
+
+    for i in order:
+        width, height = sizes[i]
+        if width + padding > page_size or height + padding > page_size:
+            raise ValueError(f"An image of {width}x{height} does not fit on a {page_size} page")
+
+        if x + width + padding > page_size:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        if y + height + padding > page_size:
+            page, x, y, shelf_height = page + 1, 0, 0, 0
+
+        placements[i] = (page, x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height + padding)
+
+    return placements
+
+
+def bake(asset_directory, source="png", page_size=PAGE_SIZE, padding=PADDING):
+    """ Bake asset_directory/source into asset_directory/atlas. Region names are
+    relative to asset_directory, like "png/alienBlue_front.png".
+    """
+    asset_directory = Path(asset_directory)
+    files = sorted(path for path in (asset_directory / source).rglob("*")
+                   if path.suffix.lower() in IMAGE_SUFFIXES)
+    images = [PIL.Image.open(path).convert("RGBA") for path in files]
+    placements = shelf_pack([image.size for image in images], page_size, padding)
+
+    page_count = max((page for page, _, _ in placements.values()), default=-1) + 1
+    pages = [PIL.Image.new("RGBA", (page_size, page_size)) for _ in range(page_count)]
+    regions = {}
+    for i, (page, x, y) in placements.items():
+        pages[page].paste(images[i], (x, y))
+        name = files[i].relative_to(asset_directory).as_posix()
+        regions[name] = [page, x, y, images[i].width, images[i].height]
+
+    # Pages of an earlier, larger bake would otherwise be left behind
+    output = asset_directory / ATLAS_DIRECTORY
+    shutil.rmtree(output, ignore_errors=True)
+    output.mkdir()
+    page_names = []
+    for number, page in enumerate(pages):
+        page_name = f"{ATLAS_DIRECTORY}/page_{number}.png"
+        page.save(asset_directory / page_name)
+        page_names.append(page_name)
+
+    with open(output / INDEX_NAME, "w") as index_file:
+        json.dump({"pages": page_names, "regions": regions}, index_file)
+
+    return len(regions), len(pages)
+
+
+def baked_images(asset_directory):
+    """ Names of the images in the atlas baked in asset_directory, relative to it. """
+    with open(Path(asset_directory) / ATLAS_DIRECTORY / INDEX_NAME) as index_file:
+        return set(json.load(index_file)["regions"])
+
+
+def read_resource(resolve, resource):
+    # With a mounted asset archive resolve hands back a file object
+    source = resolve(resource)
+    if hasattr(source, "read"):
+        return source
+    return open(source, "rb")
+
+
+class BakedAtlas:
+    def __init__(self, handle, resolve=arcade.resources.resolve):
+        """ resolve is the resolver mount() returns when the assets are in an archive. """
+        self.prefix = f":{handle}:"
+        self.resolve = resolve
+        with read_resource(resolve, f"{self.prefix}{ATLAS_DIRECTORY}/{INDEX_NAME}") as index_file:
+            index = json.loads(index_file.read())
+
+        self.page_names = index["pages"]
+        self.regions = index["regions"]
+        self.pages = {}
+        self.textures = {}
+
+    def __contains__(self, resource):
+        return (isinstance(resource, str) and resource.startswith(self.prefix) and
+                resource[len(self.prefix):] in self.regions)
+
+    def page(self, number):
+        if number not in self.pages:
+            with read_resource(self.resolve, self.prefix + self.page_names[number]) as page_file:
+                page = PIL.Image.open(page_file)
+                page.load()
+            self.pages[number] = page
+        return self.pages[number]
+
+    def texture(self, resource):
+        if resource not in self.textures:
+            page, x, y, width, height = self.regions[resource[len(self.prefix):]]
+            image = self.page(page).crop((x, y, x + width, y + height))
+            self.textures[resource] = arcade.Texture(image, hash=resource)
+        return self.textures[resource]
+
+    def load_texture(self, resource):
+        """ The atlas region for resource, or arcade.load_texture() of it if it
+        is not in the atlas.
+        """
+        if resource in self:
+            return self.texture(resource)
+        return arcade.load_texture(resource)
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "assets"
+    region_count, page_count = bake(directory)
+    print(f"Baked {region_count} images into {page_count} atlas pages")
@@ -1,12 +1,23 @@
+import shutil
 import subprocess
+import sys
+
+from asset_pack import pack
+from atlas_baker import bake, baked_images
 
 EXECUTABLE_NAME = "nuitka_build.exe"
-DATA_DIRECTORY_SPEC = "assets=assets"
+ASSET_ARCHIVE = "assets.pak"
+
+# Bake the sprites into atlas pages, then pack the pages and every asset they
+# do not cover into one archive. The archive ships next to the executable
+# rather than bundled as data, so the one file build reads it in place instead
+# of extracting it when it starts
+bake("assets")
+pack("assets", ASSET_ARCHIVE, exclude=baked_images("assets"))
 
 nuitka_command = [
-    'python3.11.exe', '-m', 'nuitka',
+    sys.executable, '-m', 'nuitka',
     f'--output-filename={EXECUTABLE_NAME}',
-    f'--include-data-dir={DATA_DIRECTORY_SPEC}',
     '--output-dir=dist',
     '--remove-output',
     './building_example.py',
@@ -14,4 +25,6 @@ nuitka_command = [
     '--onefile'
 ]
 
-subprocess.run(nuitka_command)
\ No newline at end of file
+subprocess.run(nuitka_command, check=True)
+
+shutil.copy(ASSET_ARCHIVE, "dist")
@@ -1,8 +1,24 @@
+import shutil
+
 import PyInstaller.__main__
 
+from asset_pack import pack
+from atlas_baker import bake, baked_images
+
+EXECUTABLE_NAME = "pyinstaller_build.exe"
+ASSET_ARCHIVE = "assets.pak"
+
+# Bake the sprites into atlas pages, then pack the pages and every asset they
+# do not cover into one archive. The archive ships next to the executable
+# rather than bundled as data, so the one file build reads it in place instead
+# of extracting it when it starts
+bake('assets')
+pack('assets', ASSET_ARCHIVE, exclude=baked_images('assets'))
+
 PyInstaller.__main__.run([
     'building_example.py',
-    '--name', 'pyinstaller_build.exe',
+    '--name', EXECUTABLE_NAME,
     '--onefile',
-    '--add-data', 'assets;assets'
-])
\ No newline at end of file
+])
+
+shutil.copy(ASSET_ARCHIVE, "dist")
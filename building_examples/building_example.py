@@ -1,11 +1,66 @@
 import sys
 import os
+import time
 from pathlib import Path
 
+# Set by startup_benchmark.py, prints when each startup phase is done and
+# quits after the first frame
+STARTUP_BENCHMARK = bool(os.environ.get("STARTUP_BENCHMARK"))
+
+
+def mark(phase):
+    if STARTUP_BENCHMARK:
+        print(f"STARTUP {phase} {time.time():.6f}", flush=True)
+
+
 import arcade
 
+mark("import")
+
+from asset_pack import AssetArchive, mount
+from atlas_baker import BakedAtlas, ATLAS_DIRECTORY, INDEX_NAME
+
+ASSET_ARCHIVE = "assets.pak"
+
+
+def find_archive():
+    """ The assets.pak a build ships next to its executable (see asset_pack.py),
+    or one next to the script, or None.
+    """
+    directories = [Path(sys.argv[0]).resolve().parent, Path(__file__).parent.resolve()]
+    if getattr(sys, "frozen", False):
+        directories.insert(0, Path(sys.executable).parent)
+    for directory in directories:
+        path = directory / ASSET_ARCHIVE
+        if path.exists():
+            return AssetArchive(path)
+    return None
+
+
+# Builds read the packed archive next to their executable, running from
+# source uses the assets directory directly
 asset_dir = os.path.join(Path(__file__).parent.resolve(), "assets")
-arcade.resources.add_resource_handle("assets", asset_dir)
+atlas_index = f"{ATLAS_DIRECTORY}/{INDEX_NAME}"
+archive = find_archive()
+if archive is not None:
+    resolve = mount("assets", archive)
+    has_atlas = atlas_index in archive
+else:
+    arcade.resources.add_resource_handle("assets", asset_dir)
+    resolve = arcade.resources.resolve
+    has_atlas = os.path.exists(os.path.join(asset_dir, atlas_index))
+
+# If the builder baked an atlas, textures are taken out of it
+atlas = BakedAtlas("assets", resolve) if has_atlas else None
+
+
+def load_texture(resource):
+    if atlas is not None:
+        return atlas.load_texture(resource)
+    return arcade.load_texture(resource)
+
+
+mark("resources")
 
 print("__file__:", __file__, Path(__file__).resolve())
 print("sys.argv[0]:", sys.argv[0], Path(sys.argv[0]).resolve())
@@ -14,9 +69,10 @@ class MyGame(arcade.Window):
     def __init__(self):
         super().__init__(400, 400, "Building Example")
         self.sprite_list = arcade.SpriteList()
+        self.first_frame = True
 
     def setup(self):
-        alien = arcade.Sprite(":assets:png/alienBlue_front.png")
+        alien = arcade.Sprite(load_texture(":assets:png/alienBlue_front.png"))
         alien.position = (200, 200)
         self.sprite_list.append(alien)
 
@@ -24,7 +80,15 @@ class MyGame(arcade.Window):
         arcade.start_render()
         self.sprite_list.draw()
 
+        if self.first_frame:
+            self.first_frame = False
+            mark("first_frame")
+            if STARTUP_BENCHMARK:
+                self.close()
+
 
 game = MyGame()
+mark("window")
 game.setup()
-arcade.run()
\ No newline at end of file
+mark("assets")
+arcade.run()
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+""" Time to first frame of building_example.py, from source and from the
+PyInstaller and Nuitka builds.
+
+Each target is launched several times with STARTUP_BENCHMARK set, which makes
+the example print a timestamp when it finishes importing, registering
+resources, creating the window, loading its assets and drawing its first
+frame, and then quit. The source target is then run as many times again with
+-X importtime so the slowest imports can be reported. That is a pass of its
+own, as printing the import times slows the launch the phases are timed on.
+
+Every run is appended to a results file, and the medians are compared with
+the previous results for the same target so regressions between builds show
+up straight away.
+"""
+
+RESULTS_FILE = "startup_results.jsonl"
+DEFAULT_RUNS = 5
+PHASES = ["import", "resources", "window", "assets", "first_frame"]
+SLOWEST_IMPORTS = 10
+
+TARGETS = {
+    "source": [sys.executable, "building_example.py"],
+    "pyinstaller": [os.path.join("dist", "pyinstaller_build.exe")],
+    "nuitka": [os.path.join("dist", "nuitka_build.exe")],
+}
+
+# Only the interpreter takes -X, the builds have no import breakdown
+IMPORT_PROFILES = {
+    "source": [sys.executable, "-X", "importtime", "building_example.py"],
+}
+
+
+def parse_markers(stdout, launched):
+    """ Seconds from launch to the end of each phase. """
+    times = {}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "STARTUP":
+            times[parts[1]] = float(parts[2]) - launched
+    return times
+
+
+def parse_importtime(stderr):
+    """ {module: cumulative seconds} of the top level imports. """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that imported them
+        if not name[1:].startswith(" "):
+            imports[name.strip()] = int(cumulative) / 1e6
+    return imports
+
+
+def run_once(command):
+    """ The phase times and the stderr of one launch. """
+    env = dict(os.environ, STARTUP_BENCHMARK="1")
+    launched = time.time()
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{command[0]} exited with {result.returncode}:\n{result.stderr}")
+
+    return parse_markers(result.stdout, launched), result.stderr
+
+
+def slowest_imports(name, runs):
+    """ The median slowest top level imports of name, from launches of its own. """
+    command = IMPORT_PROFILES.get(name)
+    if command is None:
+        return []
+
+    imports = {}
+    for _ in range(runs):
+        _, stderr = run_once(command)
+        for module, seconds in parse_importtime(stderr).items():
+            imports.setdefault(module, []).append(seconds)
+    slowest = sorted(((statistics.median(times), module) for module, times in imports.items()),
+                     reverse=True)[:SLOWEST_IMPORTS]
+    return [[module, seconds] for seconds, module in slowest]
+
+
+def benchmark(name, runs):
+    command = TARGETS[name]
+    if not os.path.exists(command[-1]):
+        print(f"Skipping {name}, {command[-1]} does not exist")
+        return None
+
+    phase_runs = [run_once(command)[0] for _ in range(runs)]
+    medians = {phase: statistics.median(run[phase] for run in phase_runs)
+               for phase in PHASES if all(phase in run for run in phase_runs)}
+
+    return {"target": name,
+            "runs": runs,
+            "phases": medians,
+            "slowest_imports": slowest_imports(name, runs)}
+
+
+def previous_result(results_file, target):
+    if not os.path.exists(results_file):
+        return None
+
+    previous = None
+    with open(results_file) as results:
+        for line in results:
+            result = json.loads(line)
+            if result["target"] == target:
+                previous = result
+    return previous
+
+
+def report(result, previous):
+    print(f"## {result['target']} ({result['label']}, median of {result['runs']} runs)")
+    last = 0.0
+    for phase in PHASES:
+        if phase not in result["phases"]:
+            continue
+        seconds = result["phases"][phase]
+        line = f"  {phase:12s} {seconds * 1000:8.1f} ms  (+{(seconds - last) * 1000:.1f} ms)"
+        if previous and phase in previous["phases"]:
+            delta = seconds - previous["phases"][phase]
+            line += f"  {delta * 1000:+.1f} ms vs {previous['label']}"
+        print(line)
+        last = seconds
+
+    if result["slowest_imports"]:
+        print("  slowest imports:")
+        for module, seconds in result["slowest_imports"]:
+            print(f"    {module:30s} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to first frame benchmark")
+    # Not choices=, argparse checks an empty or default list against them as a whole
+    parser.add_argument("targets", nargs="*", metavar="TARGET",
+                        help=f"any of {', '.join(TARGETS)}, defaults to all of them")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--label", default=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M"),
+                        help="name for this set of results, e.g. a commit or build number")
+    parser.add_argument("--results", default=RESULTS_FILE)
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in TARGETS]
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(unknown)} (choose from {', '.join(TARGETS)})")
+
+    for target in args.targets or list(TARGETS):
+        result = benchmark(target, args.runs)
+        if result is None:
+            continue
+
+        result["label"] = args.label
+        report(result, previous_result(args.results, target))
+        with open(args.results, "a") as results:
+            results.write(json.dumps(result) + "\n")
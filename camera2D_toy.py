@@ -1,7 +1,21 @@
+import argparse
 from typing import Optional, Tuple
 
 import arcade
 
+from common.background import BackgroundLayer
+from common.layout import SplitScreenLayout, ROW
+from common.camera_rig import CameraRig
+from common.timestep import FixedTimestep, SpriteInterpolator
+from common.input import InputManager
+from common import texture_cache
+from common.preloader import Asset, Preloader, LoadingScreen
+from common.physics_config import PhysicsConfig
+from common.physics_process import PhysicsProcess, WorldSpec, body_spec
+from common.swarm import turn_body
+from common.replay import InputRecorder, run_replay, KEY_PRESS, KEY_RELEASE
+from common.camera_benchmark import CameraSweep, load_spec, write_results
+
 """ A simple Camera toy that allows you to controller different components of the
 new 3.0 Camera. Here are the controls:
 
@@ -37,6 +51,13 @@ Numpad 8 - Change the direction of the vector in the positive y direction
 Numpad 2 - Change the direction of the vector in the negative y direction
 Numpad 7 - Change the direction of the vector in the negative z direction
 Numpad 9 - Change the direction to the vector in the positive z direction
+
+## Benchmarking
+
+--sweep SPEC applies every camera state in the sweep specification SPEC in
+turn, renders a fixed number of frames for each and writes the CPU and GPU
+frame times and draw calls to --output. See common/camera_benchmark.py for the
+format of SPEC.
 """
 
 TITLE = "Camera 2D Toy"
@@ -47,6 +68,13 @@ BACKGROUND_IMAGE = ":resources:images/backgrounds/stars.png"
 
 DEFAULT_DAMPING = 1.0
 
+# Physics runs at a fixed rate, independent of the frame rate
+PHYSICS_RATE = 60
+PHYSICS_SUBSTEPS = 2
+MAX_PHYSICS_STEPS = 5
+# Pymunk's own defaults, as used by the in process engine
+PROCESS_PHYSICS_CONFIG = PhysicsConfig(sleep_time_threshold=None, use_spatial_hash=False)
+
 GRAVITY = 0.0
 SHIP_MASS = 1.0
 SHIP_FRICTION = 0.0
@@ -57,6 +85,11 @@ ROTATION_SPEED = 0.05
 KEYBOARD_THRUSTER_FORCE = 200.0
 
 SHIP_SCALING = 0.5
+SHIP_HIT_BOX_ALGORITHM = arcade.hitbox.PymunkHitBoxAlgorithm()
+SHIP_SPRITE = ":resources:images/space_shooter/playerShip1_orange.png"
+
+# Where --sweep writes its results
+SWEEP_OUTPUT = "camera_sweep.csv"
 
 PLAYER_ONE = 0
 PLAYER_TWO = 1
@@ -64,6 +97,14 @@ PLAYER_TWO = 1
 CAMERA_ONE = 0
 CAMERA_TWO = 1
 
+# Key -> (player, input field)
+KEYBOARD_BINDINGS = {
+    arcade.key.W: (PLAYER_ONE, "up"),
+    arcade.key.S: (PLAYER_ONE, "down"),
+    arcade.key.A: (PLAYER_ONE, "left"),
+    arcade.key.D: (PLAYER_ONE, "right"),
+}
+
 VIEWPORT = "VIEWPORT SIZE"
 CAMERA_POSITION = "CAMERA POSITION"
 CAMERA_UP = "CAMERA UP"
@@ -77,7 +118,7 @@ class Player(arcade.Sprite):
     def __init__(self, main,
                  start_position: Tuple):
         self.shape = None
-        self.sprite_filename = ":resources:images/space_shooter/playerShip1_orange.png"
+        self.sprite_filename = SHIP_SPRITE
         self.main = main
         self.dx = 0.0
         self.dy = 0.0
@@ -87,80 +128,75 @@ class Player(arcade.Sprite):
         self.start_position = start_position
         self.friction = SHIP_FRICTION
 
-        self.w_pressed = 0.0
-        self.s_pressed = 0.0
-        self.a_pressed = 0.0
-        self.d_pressed = 0.0
-        self.left_pressed = 0.0
-        self.right_pressed = 0.0
+        self.input = None
 
-        super().__init__(self.sprite_filename)
+        # Every ship shares one texture and traced hit box
+        texture, _ = texture_cache.load_texture(self.sprite_filename,
+                                                hit_box_algorithm=SHIP_HIT_BOX_ALGORITHM,
+                                                scale=SHIP_SCALING)
+        super().__init__(texture, scale=SHIP_SCALING)
         self.position = start_position
         self.mass = SHIP_MASS
         self.friction = SHIP_FRICTION
         self.elasticity = SHIP_ELASTICITY
-        self.texture = arcade.load_texture(self.sprite_filename,
-                                           hit_box_algorithm=arcade.hitbox.PymunkHitBoxAlgorithm())
         self.main = main
-        self.scale = SHIP_SCALING
 
     def setup(self):
         self.body = self.main.physics_engine.get_physics_object(self).body
         self.shape = self.main.physics_engine.get_physics_object(self).shape
 
-    def apply_angle_damping(self):
-        self.body.angular_velocity /= 1.05
-
     def on_update(self, delta_time: float):
         super().update()
 
-        self.dx = self.a_pressed + self.d_pressed
-        self.dy = self.w_pressed + self.s_pressed
-        self.applied_rotational_vel = self.left_pressed - self.right_pressed
+        self.dx = self.input.thrust_x * KEYBOARD_THRUSTER_FORCE
+        self.dy = self.input.thrust_y * KEYBOARD_THRUSTER_FORCE
+        self.applied_rotational_vel = self.input.rotation * ROTATION_SPEED
 
-        if self.applied_rotational_vel == 0.0:
-            self.apply_angle_damping()
+        # In a physics process the worker turns the body
+        if self.body is None:
+            return
 
-        self.body.angular_velocity += self.applied_rotational_vel
-        self.body.apply_force_at_world_point((self.dx, -self.dy), (self.center_x, self.center_y))
+        # Called once per physics step, with the step time
+        turn_body(self.body, self.applied_rotational_vel, delta_time)
 
-    def on_key_press(self, key: int, modifiers: int):
-        if key == arcade.key.W:
-            self.w_pressed = -KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.S:
-            self.s_pressed = KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.A:
-            self.a_pressed = -KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.D:
-            self.d_pressed = KEYBOARD_THRUSTER_FORCE
-
-    def on_key_release(self, key: int, modifiers: int):
-        if key == arcade.key.W:
-            self.w_pressed = 0.0
-        elif key == arcade.key.S:
-            self.s_pressed = 0.0
-        elif key == arcade.key.A:
-            self.a_pressed = 0.0
-        elif key == arcade.key.D:
-            self.d_pressed = 0.0
+    def apply_thrust(self):
+        # Pymunk clears forces after every step, so this is applied each substep.
+        # The sprite is only resynced after the last substep, so use the body position
+        if self.dx or self.dy:
+            self.body.apply_force_at_world_point((self.dx, self.dy), self.body.position)
 
 
 class Game(arcade.Window):
-    def __init__(self):
+    def __init__(self, visible=True, physics_process=False):
         self.screen_width = SCREEN_WIDTH
         self.screen_height = SCREEN_HEIGHT
+        # on_resize can fire while the window is being created
+        self.layout = None
         super().__init__(self.screen_width,
                          self.screen_height,
                          TITLE,
-                         resizable=True)
+                         resizable=True,
+                         visible=visible)
         arcade.set_background_color(BACKGROUND_COLOR)
         self.background_image = BACKGROUND_IMAGE
+        self.background_layer = None
         self.cameras = []
+        self.camera_rigs = []
+        self.frame_time = 0.0
         self.camera = None
         self.project = None
         self.camera_viewport = None
         self.physics_engine = None
+        self.timestep = None
+        self.interpolator = None
+        self.input = None
+        self.recorder = None
+        self.use_physics_process = physics_process
+        self.physics_process = None
         self.players: Player = None
+        self.preloader = None
+        self.loading_screen = None
+        self.loading = True
         self.controlling = 0
 
     def switch_controlling(self, direction):
@@ -177,14 +213,18 @@ class Game(arcade.Window):
         print("You are now controlling: ", controllers[self.controlling])
 
     def on_key_press(self, key: int, modifiers: int):
+        if self.loading:
+            return
+        if self.recorder:
+            self.recorder.record(self.timestep.frame, KEY_PRESS, key, modifiers)
+
         if key == arcade.key.PERIOD:
             self.switch_controlling("right")
 
         if key == arcade.key.COMMA:
             self.switch_controlling("left")
 
-        for player in self.players:
-            player.on_key_press(key, modifiers)
+        self.input.on_key_press(key, modifiers)
 
         shrink_or_grow = -(modifiers & arcade.key.MOD_CTRL) or 1
         change_size = 5 * ((arcade.key.MOD_ALT & modifiers) + 1)
@@ -270,16 +310,48 @@ class Game(arcade.Window):
 
             print(f"Projection (left, right, bottom, top): {self.cameras[0].projection}")
 
-    def on_key_release(self, key: int, modifers: int):
-        for player in self.players:
-            player.on_key_release(key, modifers)
+        # The controls above change the camera directly, behind the rig's back
+        self.camera_rigs[0].mark_dirty()
 
-    def setup(self):
+    def on_key_release(self, key: int, modifers: int):
+        if self.loading:
+            return
+        if self.recorder:
+            self.recorder.record(self.timestep.frame, KEY_RELEASE, key, modifers)
+
+        self.input.on_key_release(key, modifers)
+
+    def on_close(self):
+        if self.recorder:
+            self.recorder.save()
+        if self.physics_process:
+            self.physics_process.close()
+        super().on_close()
+
+    def setup(self, block=False):
+        """ Start loading the assets, the preloader then builds the world once
+        they are all uploaded. block loads everything right away, for headless runs.
+        """
+        self.preloader = Preloader(self.assets(), tasks=[self.setup_world()])
+        self.loading_screen = LoadingScreen(self.preloader)
+        if block:
+            self.preloader.wait()
+
+    def assets(self):
+        return [Asset(SHIP_SPRITE, SHIP_HIT_BOX_ALGORITHM, SHIP_SCALING),
+                Asset(self.background_image, arcade.hitbox.algo_bounding_box)]
+
+    def setup_world(self):
+        """ A preloader task, yields while the physics process starts. """
         self.setup_spritelists()
         self.setup_physics_engine()
         self.setup_players()
+        yield from self.setup_physics_process()
         self.setup_players_cameras()
-        self.background = arcade.load_texture(self.background_image)
+        self.background, _ = texture_cache.load_texture(self.background_image,
+                                                        arcade.hitbox.algo_bounding_box)
+        self.background_layer = BackgroundLayer(self.background)
+        self.loading = False
 
     def setup_spritelists(self):
         self.players = arcade.SpriteList()
@@ -287,22 +359,48 @@ class Game(arcade.Window):
     def setup_physics_engine(self):
         self.physics_engine = arcade.PymunkPhysicsEngine(damping=DEFAULT_DAMPING,
                                                          gravity=(0, 0))
+        self.timestep = FixedTimestep(PHYSICS_RATE, PHYSICS_SUBSTEPS, MAX_PHYSICS_STEPS)
+        self.interpolator = SpriteInterpolator(self.players)
 
     def setup_players(self):
         self.players.append(Player(self, (self.screen_width / 2.0, self.screen_height / 2.0)))
 
         self.players_list = [self.players[PLAYER_ONE]]
 
+        self.input = InputManager(len(self.players), KEYBOARD_BINDINGS)
+        for player, player_input in zip(self.players, self.input.players):
+            player.input = player_input
+
+        if self.use_physics_process:
+            return
+
         self.physics_engine.add_sprite(self.players[PLAYER_ONE],
                                        friction=self.players[PLAYER_ONE].friction,
                                        elasticity=self.players[PLAYER_ONE].elasticity,
                                        mass=self.players[PLAYER_ONE].mass,
                                        moment_of_inertia=arcade.PymunkPhysicsEngine.MOMENT_INF,
                                        collision_type="SHIP")
-
         for player in self.players:
             player.setup()
 
+    def setup_physics_process(self):
+        if not self.use_physics_process:
+            return
+
+        world = WorldSpec(rate=PHYSICS_RATE,
+                          substeps=PHYSICS_SUBSTEPS,
+                          max_steps=MAX_PHYSICS_STEPS,
+                          damping=DEFAULT_DAMPING,
+                          config=PROCESS_PHYSICS_CONFIG,
+                          players=tuple(body_spec(player, SHIP_MASS,
+                                                  arcade.PymunkPhysicsEngine.MOMENT_INF,
+                                                  SHIP_FRICTION, SHIP_ELASTICITY)
+                                        for player in self.players))
+        self.physics_process = PhysicsProcess(world)
+        # The worker builds its own bodies, the loading screen keeps drawing meanwhile
+        for _ in self.physics_process.starting():
+            yield 1.0
+
     def setup_players_cameras(self):
         # Viewport is defined as: (left, bottom, width, height)
         self.camera_viewport = (0, 0, self.screen_width, self.screen_height)
@@ -313,28 +411,113 @@ class Game(arcade.Window):
 
         self.camera = player_one_camera
         self.cameras.append(player_one_camera)
+        self.camera_rigs.append(CameraRig(player_one_camera))
+
+        self.layout = SplitScreenLayout(self.cameras, ROW)
+
+    def on_resize(self, width: int, height: int):
+        super().on_resize(width, height)
+        self.screen_width = width
+        self.screen_height = height
+        if self.layout:
+            self.layout.on_resize(width, height)
 
     def center_camera_on_player(self, player_num):
-        self.cameras[player_num].position = (self.players_list[player_num].center_x,
-                                             self.players_list[player_num].center_y)
+        self.camera_rigs[player_num].follow(self.players_list[player_num].center_x,
+                                            self.players_list[player_num].center_y,
+                                            self.frame_time)
 
-    def on_update(self, delta_time: float):
+    def fixed_update(self, delta_time: float):
+        self.interpolator.save_previous()
         self.players.on_update(delta_time)
-        self.physics_engine.step()
-        #self.center_camera_on_player(PLAYER_ONE)
+
+        for substep in range(self.timestep.substeps):
+            for player in self.players:
+                player.apply_thrust()
+            self.physics_engine.step(delta_time=self.timestep.substep_time,
+                                     resync_sprites=substep == self.timestep.substeps - 1)
+
+    def on_update(self, delta_time: float):
+        if self.loading:
+            self.preloader.upload()
+            return
+
+        self.frame_time = delta_time
+        if self.layout.update():
+            for rig in self.camera_rigs:
+                rig.mark_dirty()
+
+        if self.physics_process:
+            for index, player in enumerate(self.players):
+                player.on_update(delta_time)
+                self.physics_process.send_input(index, player.dx, player.dy,
+                                                player.applied_rotational_vel)
+            return
+
+        self.interpolator.restore()
+        if self.timestep.advance(delta_time, self.fixed_update):
+            self.interpolator.save_current()
 
     def on_draw(self):
+        if self.loading:
+            self.clear()
+            self.loading_screen.draw(self.width, self.height)
+            return
+
+        if self.physics_process:
+            self.physics_process.sync([self.players])
+        else:
+            self.interpolator.interpolate(self.timestep.alpha)
+        #self.center_camera_on_player(PLAYER_ONE)
+        self.background_layer.stream(self.cameras)
+
         for camera in range(len(self.cameras)):
-            self.cameras[camera].use()
+            self.camera_rigs[camera].use()
             self.clear()
-            arcade.draw_lrwh_rectangle_textured(0, 0,
-                                                self.screen_width, self.screen_height,
-                                                self.background)
+            self.background_layer.draw(self.cameras[camera], self.camera_rigs[camera])
             self.players.draw()
 
 
 
 if __name__ == "__main__":
-    window = Game()
-    window.setup()
-    arcade.run()
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument("--record", metavar="FILE",
+                        help="record key presses to FILE while playing")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay FILE headless as fast as possible and report the result")
+    parser.add_argument("--frames", type=int,
+                        help="number of physics steps to replay, defaults to the last recorded event")
+    parser.add_argument("--physics-process", action="store_true",
+                        help="run the physics in a separate process")
+    parser.add_argument("--sweep", metavar="SPEC",
+                        help="render every camera state in the JSON sweep SPEC and report the frame times")
+    parser.add_argument("--output", metavar="FILE", default=SWEEP_OUTPUT,
+                        help=f"where --sweep writes its results, defaults to {SWEEP_OUTPUT}")
+    args = parser.parse_args()
+    if args.physics_process and (args.record or args.replay):
+        parser.error("--physics-process can not be recorded or replayed, it is not deterministic")
+    if args.sweep and (args.record or args.replay):
+        parser.error("--sweep can not be combined with --record or --replay")
+
+    if args.sweep:
+        window = Game(physics_process=args.physics_process)
+        window.setup(block=True)
+        rows = CameraSweep(window, window.camera_rigs[CAMERA_ONE], load_spec(args.sweep)).run()
+        write_results(rows, args.output)
+        for row in rows:
+            print(f"{row['name']}: cpu {row['cpu_mean_ms']:.2f} ms, gpu {row['gpu_mean_ms']:.2f} ms, "
+                  f"{row['draw_calls']:.0f} draw calls")
+        print(f"Wrote {len(rows)} camera states to {args.output}")
+        window.on_close()
+    elif args.replay:
+        window = Game(visible=False)
+        window.setup(block=True)
+        steps, steps_per_second, digest = run_replay(window, args.replay, args.frames)
+        print(f"Replayed {steps} steps at {steps_per_second:.1f} steps/s")
+        print(f"Final state hash: {digest}")
+    else:
+        window = Game(physics_process=args.physics_process)
+        window.setup()
+        if args.record:
+            window.recorder = InputRecorder(args.record, PHYSICS_RATE)
+        arcade.run()
@@ -0,0 +1,99 @@
+import numpy as np
+import arcade
+from arcade.camera.projection_functions import (generate_view_matrix,
+                                                generate_orthographic_matrix)
+
+""" Vectorized versions of Camera2D.project and Camera2D.unproject.
+
+Camera2D.project builds the view and projection matrices and pushes a single
+point through them with pyglet's Vec4/Mat4 math. That is fine for one point,
+but far too slow when sweeping millions of world coordinates. The BatchProjector
+builds the matrices once and then projects a whole (N, 2) or (N, 3) array in
+one go.
+
+The combined matrix and its inverse are still computed with pyglet's Mat4, and
+the per-point arithmetic is done in the same order as arcade's
+project_orthographic/unproject_orthographic, so the results match the
+per-point path bit for bit.
+"""
+
+
+def mat4_to_numpy(mat):
+    # pyglet's Mat4 is stored column major, numpy wants row major
+    return np.array(mat, dtype=np.float64).reshape(4, 4).T
+
+
+def as_points(points):
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] not in (2, 3):
+        raise ValueError(f"Expected an (N, 2) or (N, 3) array of points, got {points.shape}")
+    return points
+
+
+class BatchProjector:
+    def __init__(self, camera: arcade.camera.Camera2D):
+        self.camera = camera
+        self.matrix = None
+        self.inverse = None
+        self.viewport = None
+        self.refresh()
+
+    def refresh(self):
+        """ Rebuild the matrices, call after changing the camera. """
+        view = generate_view_matrix(self.camera.view_data)
+        projection = generate_orthographic_matrix(self.camera.projection_data,
+                                                  self.camera.zoom)
+        full_projection = projection @ view
+
+        self.matrix = mat4_to_numpy(full_projection)
+        self.inverse = mat4_to_numpy(~full_projection)
+        self.viewport = tuple(float(v) for v in self.camera.viewport)
+
+    def project(self, points):
+        """ Project an (N, 2) or (N, 3) array of world points to an (N, 2)
+        array of screen points.
+        """
+        points = as_points(points)
+        m = self.matrix
+        x = points[:, 0]
+        y = points[:, 1]
+
+        # Same summation order as pyglet's Mat4 @ Vec4
+        if points.shape[1] == 3:
+            z = points[:, 2]
+            proj_x = x * m[0, 0] + y * m[0, 1] + z * m[0, 2] + m[0, 3]
+            proj_y = x * m[1, 0] + y * m[1, 1] + z * m[1, 2] + m[1, 3]
+            proj_w = x * m[3, 0] + y * m[3, 1] + z * m[3, 2] + m[3, 3]
+        else:
+            proj_x = x * m[0, 0] + y * m[0, 1] + m[0, 3]
+            proj_y = x * m[1, 0] + y * m[1, 1] + m[1, 3]
+            proj_w = x * m[3, 0] + y * m[3, 1] + m[3, 3]
+
+        left, bottom, width, height = self.viewport
+        screen = np.empty((points.shape[0], 2), dtype=np.float64)
+        screen[:, 0] = (proj_x / proj_w + 1) / 2 * width + left
+        screen[:, 1] = (proj_y / proj_w + 1) / 2 * height + bottom
+        return screen
+
+    def unproject(self, points):
+        """ Unproject an (N, 2) or (N, 3) array of screen points to an (N, 3)
+        array of world points.
+        """
+        points = as_points(points)
+        m = self.inverse
+        left, bottom, width, height = self.viewport
+
+        x = 2.0 * (points[:, 0] - left) / width - 1
+        y = 2.0 * (points[:, 1] - bottom) / height - 1
+
+        if points.shape[1] == 3:
+            z = points[:, 2]
+            rows = [x * m[i, 0] + y * m[i, 1] + z * m[i, 2] + m[i, 3] for i in range(4)]
+        else:
+            rows = [x * m[i, 0] + y * m[i, 1] + m[i, 3] for i in range(4)]
+
+        world = np.empty((points.shape[0], 3), dtype=np.float64)
+        world[:, 0] = rows[0] / rows[3]
+        world[:, 1] = rows[1] / rows[3]
+        world[:, 2] = rows[2] / rows[3]
+        return world
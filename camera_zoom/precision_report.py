@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+
+# common is one level up from the camera_zoom scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.floating_origin import DEFAULT_REBASE_DISTANCE, REBASE_SNAP
+
+""" How much precision world positions lose far from the origin, with and
+without a floating origin.
+
+The GPU stores positions as float32, so the smallest step a sprite can move at
+a given distance from the origin is the float32 ULP (unit in the last place)
+at that distance. Multiplied by the camera zoom that is the jitter in pixels.
+With a floating origin (common/floating_origin.py) no position ever gets
+further than the rebase distance from the origin, so the error is capped.
+
+Everything is computed with NumPy over the whole range of extents at once.
+"""
+
+EXTENTS = np.logspace(2, 9, 15)
+SAMPLES_PER_EXTENT = 100_000
+
+
+def float32_ulp(positions):
+    return np.spacing(np.abs(positions).astype(np.float32)).astype(np.float64)
+
+
+def rebased(positions, rebase_distance=DEFAULT_REBASE_DISTANCE, snap=REBASE_SNAP):
+    """ Positions relative to the nearest origin a floating origin would use.
+    Positions within the rebase distance are left alone.
+    """
+    origins = np.round(positions / snap) * snap
+    return np.where(np.abs(positions) < rebase_distance, positions,
+                    positions - origins)
+
+
+def round_trip_error(positions):
+    """ How far a position moves when it is stored as float32. """
+    return np.abs(positions.astype(np.float32).astype(np.float64) - positions)
+
+
+def precision_report(extents=EXTENTS, zoom=1.0, rebase_distance=DEFAULT_REBASE_DISTANCE,
+                     samples=SAMPLES_PER_EXTENT, seed=0):
+    """ One row per extent with the worst float32 ULP and round trip error, in
+    pixels at zoom, of positions up to that extent before and after rebasing.
+    """
+    rng = np.random.default_rng(seed)
+    fractions = rng.uniform(0.0, 1.0, samples)
+    positions = np.asarray(extents, dtype=np.float64)[:, None] * fractions[None, :]
+    local = rebased(positions, rebase_distance)
+
+    return {"extent": np.asarray(extents, dtype=np.float64),
+            "ulp_before": float32_ulp(positions).max(axis=1) * zoom,
+            "ulp_after": float32_ulp(local).max(axis=1) * zoom,
+            "error_before": round_trip_error(positions).max(axis=1) * zoom,
+            "error_after": round_trip_error(local).max(axis=1) * zoom}
+
+
+if __name__ == "__main__":
+    zoom = 1.0
+    report = precision_report(zoom=zoom)
+
+    print(f"float32 precision in pixels at zoom {zoom}, rebase distance {DEFAULT_REBASE_DISTANCE}")
+    print(f"{'extent':>14} {'ulp before':>14} {'ulp after':>14} {'err before':>14} {'err after':>14}")
+    for row in zip(*report.values()):
+        print("".join(f"{value:>15.6g}" for value in row))
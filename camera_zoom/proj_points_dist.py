@@ -7,6 +7,10 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from scipy import stats
 
+from batch_projection import BatchProjector
+from streaming_stats import stream_distance_stats, DEFAULT_CHUNK_SIZE
+from projection_cache import ProjectionCache, camera_key
+
 plt.ioff()
 
 class Game(arcade.Window):
@@ -32,64 +36,74 @@ class Game(arcade.Window):
 
     def do_map(self, start, end, step):
         arr = np.arange(start, end, step)
-        proj = []
-        for i in arr:
-            proj.append(self.camera.project((0, i)))
+        points = np.zeros((arr.shape[0], 2))
+        points[:, 1] = arr
 
-        return np.array(proj)
+        return BatchProjector(self.camera).project(points)
 
 
-def create_proj_array(window, zoom, start=0, end=1, step=0.1):
-    window.zoom = zoom
-    proj_arry = window.do_map(start, end, step)
-    return proj_arry
+def create_proj_array(window, zoom, start=0, end=1, step=0.1, cache=None):
+    window.camera.zoom = zoom
+    if cache is None:
+        return window.do_map(start, end, step)
 
+    key = camera_key(window.camera, start, end, step)
+    return cache.array(key, lambda: window.do_map(start, end, step))
 
-def distance_between_points(arry):
-    j = 0
-    distances = []
-    for i in range(arry.shape[0]):
-        if i == 0:
-            continue
-        distances.append((arry[i] - arry[i - 1])[1])
 
-    return distances
+def distance_between_points(arry):
+    return np.diff(arry[:, 1])
 
 def dis(arry):
-    distances = []
-    for i in range(arry.shape[0]):
-        if i == 0:
-            continue
-        distances.append((arry[i] - arry[i - 1]))
-
-    return distances
-
-def do_thing(window, zoom, start, end, step):
-    arry = create_proj_array(window, zoom, start, end, step)
-    distances = distance_between_points(arry)
+    return np.diff(arry, axis=0)
 
-    dist_np = np.array(distances)
-
-    min_dis = 10000000000
-    for d in distances:
-        if d < min_dis:
-            min_dis = d
+def do_thing(window, zoom, start, end, step, cache=None):
+    arry = create_proj_array(window, zoom, start, end, step, cache)
+    dist_np = distance_between_points(arry)
 
     print("### New run")
     np.set_printoptions(precision=32, floatmode='fixed')
-    print(f"# of Distances: {len(distances)}")
+    print(f"# of Distances: {len(dist_np)}")
     print(f"Mode: {stats.mode(dist_np)}")
     print(f"Avg: {dist_np.mean()}")
-    print(f"min dist: {min_dis}")
+    print(f"min dist: {dist_np.min()}")
     print()
 
     return dist_np
 
 
+def do_thing_streaming(window, zoom, start, end, step, chunk_size=DEFAULT_CHUNK_SIZE,
+                       cache=None):
+    """ Same report as do_thing, but computed chunk by chunk so the projected
+    range never has to fit in memory.
+    """
+    window.camera.zoom = zoom
+
+    def compute():
+        return stream_distance_stats(BatchProjector(window.camera),
+                                     start, end, step, chunk_size).summary()
+
+    if cache is None:
+        dist_stats = compute()
+    else:
+        dist_stats = cache.stats(camera_key(window.camera, start, end, step), compute)
+
+    print("### New streaming run")
+    np.set_printoptions(precision=32, floatmode='fixed')
+    print(f"# of Distances: {dist_stats['count']}")
+    print(f"Mode: {dist_stats['mode']} ({dist_stats['mode_count']} times)")
+    print(f"Avg: {dist_stats['mean']}")
+    print(f"Variance: {dist_stats['variance']}")
+    print(f"min dist: {dist_stats['min']}")
+    print(f"max dist: {dist_stats['max']}")
+    print()
+
+    return dist_stats
+
+
 def normal_distances(start, end, step):
     array = np.arange(start, end, step)
-    distances = dis(array)
-    return np.array(distances)
+    return dis(array)
 
 window = Game()
 
@@ -98,24 +112,35 @@ start = 0
 stop = 100
 step = 1
 
-dist = do_thing(window, zoom, start, stop, step)
+# Streaming only reports the statistics, plotting a bar per point is not
+# possible for the huge ranges it is meant for.
+streaming = False
+
+# Projections and statistics are reused between runs, so restyling the plot
+# does not recompute anything.
+cache = ProjectionCache()
 
-norm_dist = normal_distances(start, stop, step)
+if streaming:
+    do_thing_streaming(window, zoom, start, stop, step, cache=cache)
+else:
+    dist = do_thing(window, zoom, start, stop, step, cache)
 
-np.set_printoptions(precision=32, floatmode='fixed')
+    norm_dist = normal_distances(start, stop, step)
+
+    np.set_printoptions(precision=32, floatmode='fixed')
 
-x = np.arange(0, len(dist), 1)
-fig, ax = plt.subplots(2, sharey=True)
-fig.suptitle(f'Distance between 0-{len(dist)}, 1 step in between')
+    x = np.arange(0, len(dist), 1)
+    fig, ax = plt.subplots(2, sharey=True)
+    fig.suptitle(f'Distance between 0-{len(dist)}, 1 step in between')
 
-plt.yscale('log')
+    plt.yscale('log')
 
-ax[0].set_title('Not Projected (i.e. should be 1)')
-ax[1].set_title('Projected - Zoom = 1')
+    ax[0].set_title('Not Projected (i.e. should be 1)')
+    ax[1].set_title('Projected - Zoom = 1')
 
-ax[0].bar(x, norm_dist)
-ax[1].bar(x, dist)
+    ax[0].bar(x, norm_dist)
+    ax[1].bar(x, dist)
 
-fig.tight_layout()
+    fig.tight_layout()
 
-plt.savefig(f"projected_{start}_to_{stop}_{step}_step.png")
\ No newline at end of file
+    plt.savefig(f"projected_{start}_to_{stop}_{step}_step.png")
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+""" On disk cache for projected arrays and distance statistics.
+
+Entries are addressed by a hash of everything that changes the projection:
+camera zoom, position, viewport, projection and the range and step that was
+projected. Arrays are stored as .npy files and handed back memory mapped, so
+reloading a large projection to re-plot it costs next to nothing. Statistics
+are stored next to them as small .json files.
+
+Every hit touches the entry, and whenever something is added the least
+recently used entries are removed until the cache fits in max_bytes.
+"""
+
+CACHE_DIRECTORY = "projection_cache"
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+
+ARRAY_SUFFIX = ".npy"
+STATS_SUFFIX = ".json"
+
+
+def camera_key(camera, start, end, step):
+    projection = camera.projection_data
+    config = {"zoom": float(camera.zoom),
+              "position": [float(v) for v in camera.position],
+              "viewport": [float(v) for v in camera.viewport],
+              "projection": [float(projection.left), float(projection.right),
+                             float(projection.bottom), float(projection.top),
+                             float(projection.near), float(projection.far)],
+              "start": float(start),
+              "end": float(end),
+              "step": float(step)}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def plain(value):
+    """ NumPy scalars as the Python int or float they hold, so counts stay ints. """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ProjectionCache:
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def touch(self, path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def get_array(self, key):
+        path = self.path(key, ARRAY_SUFFIX)
+        if not os.path.exists(path):
+            return None
+
+        self.touch(path)
+        return np.load(path, mmap_mode='r')
+
+    def put_array(self, key, array):
+        # Write to a temporary file first so a crash never leaves a half written entry
+        path = self.path(key, ARRAY_SUFFIX)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as npy_file:
+            np.save(npy_file, array)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode='r')
+
+    def get_stats(self, key):
+        path = self.path(key, STATS_SUFFIX)
+        if not os.path.exists(path):
+            return None
+
+        self.touch(path)
+        with open(path) as json_file:
+            return json.load(json_file)
+
+    def put_stats(self, key, stats):
+        path = self.path(key, STATS_SUFFIX)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump({name: plain(value) for name, value in stats.items()}, json_file)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def array(self, key, compute):
+        """ The cached array for key, or compute it, cache it and return it. """
+        array = self.get_array(key)
+        if array is None:
+            array = self.put_array(key, compute())
+        return array
+
+    def stats(self, key, compute):
+        """ The cached statistics for key, or compute them, cache them and return them. """
+        stats = self.get_stats(key)
+        if stats is None:
+            stats = compute()
+            self.put_stats(key, stats)
+        return stats
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.is_file())
+
+    def evict(self, keep=None):
+        """ Remove the least recently used entries until the cache fits,
+        never removing keep, the entry that was just written.
+        """
+        entries = [entry for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith((ARRAY_SUFFIX, STATS_SUFFIX))]
+        total = sum(entry.stat().st_size for entry in entries)
+        if total <= self.max_bytes:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
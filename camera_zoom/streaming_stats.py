@@ -0,0 +1,100 @@
+import numpy as np
+
+""" One pass, bounded memory statistics for projected point ranges.
+
+Instead of projecting an entire range and then walking it again to find the
+distances, the range is projected in fixed-size chunks. The last point of each
+chunk is carried over to the next so no distance is lost at the chunk
+boundaries, and the statistics are merged chunk by chunk.
+
+The mode is kept as a histogram of the distinct distances. Projected distances
+only take a handful of distinct float values, so this stays small even for
+ranges like 0..1e9.
+"""
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+class StreamingStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.histogram = {}
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return np.nan
+        return self.m2 / self.count
+
+    @property
+    def mode(self):
+        """ The most common value and how many times it was seen. """
+        if not self.histogram:
+            return np.nan, 0
+        value = max(self.histogram, key=self.histogram.get)
+        return value, self.histogram[value]
+
+    def summary(self):
+        mode, mode_count = self.mode
+        return {"count": self.count,
+                "mean": self.mean,
+                "variance": self.variance,
+                "min": self.min,
+                "max": self.max,
+                "mode": mode,
+                "mode_count": mode_count}
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+
+        chunk_count = values.size
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+
+        # Chan et al. parallel update of the mean and sum of squared differences
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        self.mean += delta * chunk_count / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * chunk_count / total
+        self.count = total
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        unique, counts = np.unique(values, return_counts=True)
+        for value, count in zip(unique.tolist(), counts.tolist()):
+            self.histogram[value] = self.histogram.get(value, 0) + count
+
+
+def range_length(start, end, step):
+    return max(int(np.ceil((end - start) / step)), 0)
+
+
+def projected_chunks(projector, start, end, step, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yield the projection of (0, start..end) in chunks of chunk_size points. """
+    length = range_length(start, end, step)
+    for first in range(0, length, chunk_size):
+        last = min(first + chunk_size, length)
+        points = np.zeros((last - first, 2))
+        points[:, 1] = start + np.arange(first, last, dtype=np.float64) * step
+        yield projector.project(points)
+
+
+def stream_distance_stats(projector, start, end, step, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Statistics of the projected y distance between neighbouring points. """
+    stats = StreamingStats()
+    previous = None
+    for chunk in projected_chunks(projector, start, end, step, chunk_size):
+        y = chunk[:, 1]
+        if previous is not None:
+            y = np.concatenate(([previous], y))
+        stats.update(np.diff(y))
+        previous = y[-1]
+
+    return stats
@@ -0,0 +1,101 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Tuple
+
+import arcade
+
+from batch_projection import BatchProjector
+from streaming_stats import stream_distance_stats, DEFAULT_CHUNK_SIZE
+
+""" Runs the projection precision study over a grid of camera configurations.
+
+Every combination of zoom, camera position, range and step is a
+SweepConfig. The grid is spread across a process pool where each worker owns
+a single hidden window and Camera2D, applies the configuration to it and
+computes the streaming distance statistics. The results of all workers are
+gathered into one table that can be written out as CSV.
+"""
+
+VIEWPORT = (0, 0, 10000, 10000)
+
+RESULT_FIELDS = ["zoom", "position_x", "position_y", "start", "end", "step",
+                 "count", "mean", "variance", "min", "max", "mode", "mode_count"]
+
+
+class SweepConfig(NamedTuple):
+    zoom: float
+    position: Tuple[float, float]
+    start: float
+    end: float
+    step: float
+    viewport: Tuple[int, int, int, int] = VIEWPORT
+
+
+def sweep_grid(zooms, positions, ranges, steps, viewport=VIEWPORT):
+    """ Every combination of the given zooms, positions, (start, end) ranges and steps. """
+    return [SweepConfig(zoom, position, start, end, step, viewport)
+            for zoom, position, (start, end), step
+            in itertools.product(zooms, positions, ranges, steps)]
+
+
+# One camera per worker process, created by init_worker
+worker_camera = None
+
+
+def init_worker():
+    global worker_camera
+    # Camera2D needs a window to exist, but it never has to be shown
+    arcade.Window(1, 1, "Sweep Worker", visible=False)
+    worker_camera = arcade.camera.Camera2D()
+
+
+def apply_config(camera, config: SweepConfig):
+    camera.viewport = config.viewport
+    camera.equalise()
+    camera.position = config.position
+    camera.zoom = config.zoom
+
+
+def run_config(config: SweepConfig, chunk_size=DEFAULT_CHUNK_SIZE):
+    apply_config(worker_camera, config)
+    dist_stats = stream_distance_stats(BatchProjector(worker_camera),
+                                       config.start, config.end, config.step,
+                                       chunk_size)
+
+    row = {"zoom": config.zoom,
+           "position_x": config.position[0],
+           "position_y": config.position[1],
+           "start": config.start,
+           "end": config.end,
+           "step": config.step}
+    row.update(dist_stats.summary())
+    return row
+
+
+def run_sweep(configs, processes=None):
+    """ Run every configuration across a pool of processes, one per core by
+    default. The rows come back in the same order as configs.
+    """
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as executor:
+        return list(executor.map(run_config, configs))
+
+
+def write_results(rows, filename):
+    with open(filename, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    configs = sweep_grid(zooms=[0.25, 0.5, 1, 2, 4],
+                         positions=[(0, 0), (5000, 5000), (1e6, 1e6)],
+                         ranges=[(0, 1e4), (1e6, 1e6 + 1e4), (1e8, 1e8 + 1e4)],
+                         steps=[1, 0.1])
+
+    rows = run_sweep(configs)
+    write_results(rows, "projection_sweep.csv")
+    print(f"Wrote {len(rows)} configurations to projection_sweep.csv")
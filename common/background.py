@@ -0,0 +1,117 @@
+import math
+
+import arcade
+
+from common.culling import camera_world_rect
+
+""" A persistent, tiled and optionally parallax scrolled background.
+
+The background is a SpriteList of tiles, so its geometry lives on the GPU and
+drawing it for another camera only changes the view and projection uniforms.
+Tiles are streamed in and out around the cameras as they move, keeping the
+number of quads constant no matter how large the world is. Sprites for tiles
+that scroll out of view are kept in a pool and reused for the tiles coming
+into view.
+
+A parallax factor below 1.0 makes the background scroll slower than the
+world, it is drawn through its own camera that follows the game camera at
+that fraction of its position.
+"""
+
+DEFAULT_STREAM_MARGIN = 1
+
+
+class BackgroundLayer:
+    def __init__(self, texture: arcade.Texture,
+                 tile_width=None,
+                 tile_height=None,
+                 parallax=1.0,
+                 stream_margin=DEFAULT_STREAM_MARGIN):
+        self.texture = texture
+        self.tile_width = tile_width or texture.width
+        self.tile_height = tile_height or texture.height
+        self.parallax = parallax
+        self.stream_margin = stream_margin
+
+        # Where tile (0, 0) starts, moves when the world is rebased
+        self.origin = [0.0, 0.0]
+        self.tiles = arcade.SpriteList()
+        self.active_tiles = {}
+        self.pool = []
+        self.camera = arcade.camera.Camera2D() if parallax != 1.0 else None
+
+    def parallax_rect(self, camera):
+        left, right, bottom, top = camera_world_rect(camera)
+        shift_x = camera.position[0] * (self.parallax - 1.0)
+        shift_y = camera.position[1] * (self.parallax - 1.0)
+        return left + shift_x, right + shift_x, bottom + shift_y, top + shift_y
+
+    def tiles_for_rect(self, rect):
+        left, right, bottom, top = rect
+        left, right = left - self.origin[0], right - self.origin[0]
+        bottom, top = bottom - self.origin[1], top - self.origin[1]
+        margin = self.stream_margin
+        first_x = math.floor(left / self.tile_width) - margin
+        last_x = math.floor(right / self.tile_width) + margin
+        first_y = math.floor(bottom / self.tile_height) - margin
+        last_y = math.floor(top / self.tile_height) + margin
+        return {(tile_x, tile_y)
+                for tile_x in range(first_x, last_x + 1)
+                for tile_y in range(first_y, last_y + 1)}
+
+    def stream(self, cameras):
+        """ Make sure the tiles under every camera are loaded, and release the rest. """
+        needed = set()
+        for camera in cameras:
+            needed |= self.tiles_for_rect(self.parallax_rect(camera))
+
+        for tile in self.active_tiles.keys() - needed:
+            sprite = self.active_tiles.pop(tile)
+            self.tiles.remove(sprite)
+            self.pool.append(sprite)
+
+        for tile in needed - self.active_tiles.keys():
+            sprite = self.pool.pop() if self.pool else self.create_tile()
+            sprite.center_x = self.origin[0] + (tile[0] + 0.5) * self.tile_width
+            sprite.center_y = self.origin[1] + (tile[1] + 0.5) * self.tile_height
+            self.tiles.append(sprite)
+            self.active_tiles[tile] = sprite
+
+    def shift(self, dx, dy):
+        """ Move the background with the world when it is rebased, scaled by
+        the parallax so it stays where it was on screen.
+        """
+        dx, dy = dx * self.parallax, dy * self.parallax
+        self.origin[0] += dx
+        self.origin[1] += dy
+        self.tiles.move(dx, dy)
+
+    def create_tile(self):
+        sprite = arcade.Sprite(self.texture)
+        sprite.width = self.tile_width
+        sprite.height = self.tile_height
+        return sprite
+
+    def draw(self, camera: arcade.camera.Camera2D, restore=None):
+        """ Draw the background for camera, which must be the camera in use.
+        With parallax, restore (camera by default) is used again afterwards.
+        """
+        if self.camera is None:
+            self.tiles.draw()
+            return
+
+        source = camera.projection_data
+        projection = self.camera.projection_data
+        projection.left = source.left
+        projection.right = source.right
+        projection.bottom = source.bottom
+        projection.top = source.top
+        self.camera.viewport = camera.viewport
+        self.camera.zoom = camera.zoom
+        self.camera.up = camera.up
+        self.camera.position = (camera.position[0] * self.parallax,
+                                camera.position[1] * self.parallax)
+
+        self.camera.use()
+        self.tiles.draw()
+        (restore or camera).use()
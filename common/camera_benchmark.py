@@ -0,0 +1,256 @@
+import csv
+import itertools
+import json
+import time
+from typing import NamedTuple, Optional, Tuple
+
+import arcade
+from arcade.gl import Geometry
+
+from common.camera_rig import CameraRig
+
+""" Scripted camera benchmark.
+
+A sweep specification is a JSON file with a list of camera states, a grid of
+them, or both:
+
+    {
+        "frames": 120,
+        "warmup": 10,
+        "states": [
+            {"name": "default"},
+            {"name": "far", "position": [50000, 50000]},
+            {"name": "tilted", "up": [0.7071, 0.7071]},
+            {"name": "deep", "position": [500, 500, -500], "projection": [-500, 500, -500, 500, -1000, 1000]}
+        ],
+        "grid": {"zoom": [0.25, 1, 4], "viewport": [[0, 0, 500, 500], [0, 0, 1000, 1000]]}
+    }
+
+Every state may set viewport, position (x, y or x, y, z), up and forward
+(x, y or x, y, z), projection (left, right, bottom, top and optionally near,
+far) and zoom. Anything it leaves out keeps the camera's starting value, every
+state starts from the same camera so the order does not matter.
+
+For every state the CameraSweep applies it straight to the camera, marks the
+rig dirty and then renders the warmup frames followed by the measured frames.
+Each measured frame records the CPU time of the window's on_draw, the GPU time
+and primitive count from an OpenGL query, and the number of draw calls. Draw
+calls are counted by wrapping Geometry.render while the measured frames are
+drawn, and only renders on the window's context count. Anything pyglet draws
+by itself, such as text, is not included.
+"""
+
+DEFAULT_FRAMES = 120
+DEFAULT_WARMUP_FRAMES = 10
+PERCENTILE = 95
+
+STATE_FIELDS = ["viewport", "position", "up", "forward", "projection", "zoom"]
+RESULT_FIELDS = (["name"] + STATE_FIELDS +
+                 ["frames", "cpu_mean_ms", "cpu_p95_ms", "gpu_mean_ms", "gpu_p95_ms",
+                  "draw_calls", "primitives"])
+
+
+class CameraState(NamedTuple):
+    name: str
+    viewport: Optional[Tuple[int, int, int, int]] = None
+    position: Optional[Tuple[float, ...]] = None
+    up: Optional[Tuple[float, ...]] = None
+    forward: Optional[Tuple[float, ...]] = None
+    projection: Optional[Tuple[float, ...]] = None
+    zoom: Optional[float] = None
+
+
+class SweepSpec(NamedTuple):
+    states: list
+    frames: int = DEFAULT_FRAMES
+    warmup: int = DEFAULT_WARMUP_FRAMES
+
+
+def check_fields(fields, where, allowed=STATE_FIELDS):
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise ValueError(f"{where} has unknown fields {', '.join(unknown)}, "
+                         f"expected some of {', '.join(allowed)}")
+
+
+def state_grid(grid):
+    """ Every combination of the values in grid, a dict of field -> list of values. """
+    check_fields(grid, "The grid")
+    fields = list(grid)
+    states = []
+    for values in itertools.product(*(grid[field] for field in fields)):
+        name = " ".join(f"{field}={value}" for field, value in zip(fields, values))
+        states.append(CameraState(name, **dict(zip(fields, values))))
+    return states
+
+
+def load_spec(filename):
+    with open(filename) as spec_file:
+        spec = json.load(spec_file)
+
+    states = []
+    for number, state in enumerate(spec.get("states", [])):
+        if "name" not in state:
+            raise ValueError(f"Camera state {number} in {filename} has no name")
+        check_fields(state, f"Camera state {state['name']!r} in {filename}",
+                     CameraState._fields)
+        states.append(CameraState(**state))
+    states += state_grid(spec.get("grid", {}))
+    if not states:
+        raise ValueError(f"{filename} has no camera states")
+    return SweepSpec(states,
+                     spec.get("frames", DEFAULT_FRAMES),
+                     spec.get("warmup", DEFAULT_WARMUP_FRAMES))
+
+
+def with_z(vector, current):
+    """ 2D vectors keep the z of the current one. """
+    if len(vector) == 2:
+        return vector[0], vector[1], current[2]
+    return tuple(vector)
+
+
+def snapshot(camera: arcade.camera.Camera2D):
+    view = camera.view_data
+    projection = camera.projection_data
+    return CameraState("snapshot",
+                       viewport=tuple(camera.viewport),
+                       position=tuple(view.position),
+                       up=tuple(view.up),
+                       forward=tuple(view.forward),
+                       projection=(projection.left, projection.right,
+                                   projection.bottom, projection.top,
+                                   projection.near, projection.far),
+                       zoom=view.zoom)
+
+
+def apply_state(camera: arcade.camera.Camera2D, state: CameraState):
+    """ Set every field of state that is not None on the camera. """
+    view = camera.view_data
+    projection = camera.projection_data
+
+    if state.viewport is not None:
+        camera.viewport = tuple(state.viewport)
+    if state.position is not None:
+        view.position = with_z(state.position, view.position)
+    if state.up is not None:
+        view.up = with_z(state.up, view.up)
+    if state.forward is not None:
+        view.forward = with_z(state.forward, view.forward)
+    if state.projection is not None:
+        projection.left, projection.right, projection.bottom, projection.top = state.projection[:4]
+        if len(state.projection) == 6:
+            projection.near, projection.far = state.projection[4:]
+    if state.zoom is not None:
+        view.zoom = state.zoom
+
+
+class DrawCallCounter:
+    """ Counts the Geometry.render calls on ctx while inside. Geometry has
+    slots, so render is wrapped on the class and put back on the way out.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.count = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = original = Geometry.render
+        counter = self
+
+        def render(geometry, *args, **kwargs):
+            if geometry.ctx is counter.ctx:
+                counter.count += 1
+            return original(geometry, *args, **kwargs)
+
+        Geometry.render = render
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        Geometry.render = self.original
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def percentile(values, p=PERCENTILE):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+class CameraSweep:
+    def __init__(self, window: arcade.Window, rig: CameraRig, spec: SweepSpec):
+        self.window = window
+        self.rig = rig
+        self.camera = rig.camera
+        self.spec = spec
+        self.query = window.ctx.query(samples=False, time=True, primitives=True)
+        self.draw_calls = DrawCallCounter(window.ctx)
+
+    def render_frame(self):
+        """ Draw one frame, returns its CPU time, GPU time and primitive count.
+        Leaving the query waits for the GPU, so the CPU time is taken first.
+        """
+        with self.query:
+            start = time.perf_counter()
+            self.window.on_draw()
+            cpu_time = time.perf_counter() - start
+        self.window.flip()
+        self.window.dispatch_events()
+        return cpu_time, self.query.time_elapsed / 1e9, self.query.primitives_generated
+
+    def run_state(self, state: CameraState, start: CameraState):
+        apply_state(self.camera, start)
+        apply_state(self.camera, state)
+        # The state was set on the camera directly, behind the rig's back
+        self.rig.mark_dirty()
+
+        for _ in range(self.spec.warmup):
+            self.render_frame()
+
+        cpu_times, gpu_times, primitives = [], [], []
+        with self.draw_calls:
+            self.draw_calls.count = 0
+            for _ in range(self.spec.frames):
+                cpu_time, gpu_time, frame_primitives = self.render_frame()
+                cpu_times.append(cpu_time)
+                gpu_times.append(gpu_time)
+                primitives.append(frame_primitives)
+
+        applied = snapshot(self.camera)
+        row = {"name": state.name}
+        row.update({field: getattr(applied, field) for field in STATE_FIELDS})
+        row.update({"frames": self.spec.frames,
+                    "cpu_mean_ms": mean(cpu_times) * 1000.0,
+                    "cpu_p95_ms": percentile(cpu_times) * 1000.0,
+                    "gpu_mean_ms": mean(gpu_times) * 1000.0,
+                    "gpu_p95_ms": percentile(gpu_times) * 1000.0,
+                    "draw_calls": self.draw_calls.count / max(self.spec.frames, 1),
+                    "primitives": mean(primitives)})
+        return row
+
+    def run(self):
+        """ Run every state in order and return one row per state. The camera
+        is put back the way it was afterwards.
+        """
+        # Frames should take as long as they take, not as long as the monitor
+        vsync = self.window.vsync
+        self.window.set_vsync(False)
+        start = snapshot(self.camera)
+        try:
+            return [self.run_state(state, start) for state in self.spec.states]
+        finally:
+            apply_state(self.camera, start)
+            self.rig.mark_dirty()
+            self.window.set_vsync(vsync)
+
+
+def write_results(rows, filename):
+    with open(filename, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
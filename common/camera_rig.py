@@ -0,0 +1,132 @@
+import arcade
+from arcade.camera.projection_functions import (generate_view_matrix,
+                                                generate_orthographic_matrix)
+
+""" A Camera2D wrapper with dead zone follow, smoothing and change tracking.
+
+Camera2D.use rebuilds the view and projection matrices and uploads them every
+time it is called, even when nothing about the camera changed. The rig keeps
+the matrices it last built and a dirty flag. Changes made through the rig set
+the flag, changes made to the camera directly have to call mark_dirty. use
+only rebuilds the matrices when the camera is dirty, and only uploads them
+when the window is not already using them, so an idle camera costs nothing.
+
+Following a target only moves the camera once the target leaves the dead zone,
+and then eases it there with a critically damped spring. Once the camera
+settles it stops writing its position, so it stays clean.
+"""
+
+DEFAULT_DEAD_ZONE = (200.0, 150.0)
+DEFAULT_SMOOTH_TIME = 0.2
+DEFAULT_MIN_ZOOM = 0.25
+DEFAULT_MAX_ZOOM = 4.0
+SETTLE_DISTANCE = 0.01
+
+
+def smooth_damp(current, target, velocity, smooth_time, delta_time):
+    """ Critically damped spring from current to target, returns the new
+    value and velocity.
+    """
+    omega = 2.0 / smooth_time
+    x = omega * delta_time
+    decay = 1.0 / (1.0 + x + 0.48 * x * x + 0.235 * x * x * x)
+    change = current - target
+    temp = (velocity + omega * change) * delta_time
+    velocity = (velocity - omega * temp) * decay
+    return target + (change + temp) * decay, velocity
+
+
+def dead_zone_target(position, target, half_extent):
+    """ The closest position to position that has target inside its dead zone. """
+    if target > position + half_extent:
+        return target - half_extent
+    if target < position - half_extent:
+        return target + half_extent
+    return position
+
+
+class CameraRig:
+    def __init__(self, camera: arcade.camera.Camera2D,
+                 dead_zone=DEFAULT_DEAD_ZONE,
+                 smooth_time=DEFAULT_SMOOTH_TIME,
+                 min_zoom=DEFAULT_MIN_ZOOM,
+                 max_zoom=DEFAULT_MAX_ZOOM):
+        self.camera = camera
+        self.dead_zone = dead_zone
+        self.smooth_time = smooth_time
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
+        self.velocity = [0.0, 0.0]
+        self.dirty = True
+        self.view = None
+        self.projection = None
+        self.window = arcade.get_window()
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    @property
+    def position(self):
+        return self.camera.position[0], self.camera.position[1]
+
+    @position.setter
+    def position(self, position):
+        if tuple(position) != self.position:
+            self.camera.position = position
+            self.dirty = True
+
+    @property
+    def zoom(self):
+        return self.camera.zoom
+
+    @zoom.setter
+    def zoom(self, zoom):
+        zoom = max(self.min_zoom, min(self.max_zoom, zoom))
+        if zoom != self.camera.zoom:
+            self.camera.zoom = zoom
+            self.dirty = True
+
+    def snap_to(self, x, y):
+        self.velocity = [0.0, 0.0]
+        self.position = (x, y)
+
+    def shift(self, dx, dy):
+        """ Move the camera with the world when it is rebased. """
+        x, y = self.position
+        self.position = (x + dx, y + dy)
+
+    def follow(self, x, y, delta_time):
+        """ Ease towards keeping (x, y) inside the dead zone. """
+        current = self.position
+        desired = (dead_zone_target(current[0], x, self.dead_zone[0] / 2),
+                   dead_zone_target(current[1], y, self.dead_zone[1] / 2))
+
+        if (abs(desired[0] - current[0]) < SETTLE_DISTANCE and
+                abs(desired[1] - current[1]) < SETTLE_DISTANCE):
+            self.velocity = [0.0, 0.0]
+            return
+
+        new_x, self.velocity[0] = smooth_damp(current[0], desired[0], self.velocity[0],
+                                              self.smooth_time, delta_time)
+        new_y, self.velocity[1] = smooth_damp(current[1], desired[1], self.velocity[1],
+                                              self.smooth_time, delta_time)
+        self.position = (new_x, new_y)
+
+    def use(self):
+        if self.dirty:
+            self.view = generate_view_matrix(self.camera.view_data)
+            self.projection = generate_orthographic_matrix(self.camera.projection_data,
+                                                           self.camera.zoom)
+            self.dirty = False
+
+        viewport = tuple(self.camera.viewport)
+        window = self.window
+        # Like Camera2D.use, so activate() blocks and unproject find this camera
+        window.current_camera = self.camera
+        if (window.ctx.viewport != viewport or
+                window.view != self.view or
+                window.projection != self.projection):
+            window.ctx.viewport = viewport
+            window.projection = self.projection
+            window.view = self.view
@@ -0,0 +1,155 @@
+import itertools
+import math
+from collections import defaultdict
+
+import numpy as np
+import arcade
+
+""" Per camera visibility culling for split screen rendering.
+
+Every sprite is bucketed into a uniform grid of cells by its bounds. Each frame
+only the sprites that moved to different cells are re-bucketed, and for each
+camera the cells under its world rectangle give the candidate sprites. A
+VisibleSet keeps a SpriteList per camera in sync with those candidates by only
+adding and removing the sprites that came in or went out of view, so drawing a
+camera costs what it can see instead of everything in the world. A sprite that
+stays in view keeps its place in the draw order, and sprites that come into
+view together are added in the order of the sprite lists they came from, so
+overlapping sprites do not swap from frame to frame.
+
+Checking every sprite for a new cell is itself a Python step per sprite. For
+a swarm whose positions are kept in an array, update_moved compares it to the
+array of the last frame and only checks the sprites that moved. Bodies that
+Pymunk put to sleep do not move, so the cost follows the awake ones.
+"""
+
+DEFAULT_CELL_SIZE = 256
+
+
+def camera_world_rect(camera: arcade.camera.Camera2D):
+    """ The world space (left, right, bottom, top) rectangle a camera can see. """
+    projection = camera.projection_data
+    zoom = camera.zoom
+    x, y = camera.position[0], camera.position[1]
+    up_x, up_y = camera.up[0], camera.up[1]
+    right_x, right_y = up_y, -up_x
+
+    offsets = [(projection.left / zoom, projection.bottom / zoom),
+               (projection.right / zoom, projection.bottom / zoom),
+               (projection.left / zoom, projection.top / zoom),
+               (projection.right / zoom, projection.top / zoom)]
+    xs = [x + right_x * h + up_x * v for h, v in offsets]
+    ys = [y + right_y * h + up_y * v for h, v in offsets]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def sprite_bounds(sprite: arcade.Sprite):
+    # Half the diagonal covers the sprite at any angle, without touching the hit box
+    radius = math.hypot(sprite.width, sprite.height) / 2.0
+    return (sprite.center_x - radius, sprite.center_x + radius,
+            sprite.center_y - radius, sprite.center_y + radius)
+
+
+def overlaps(a, b):
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+class CullingGrid:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.sprite_cells = {}
+        # The positions update_moved last saw, per sprite list
+        self.last_positions = {}
+
+    def cell_range(self, left, right, bottom, top):
+        return (int(left // self.cell_size), int(right // self.cell_size),
+                int(bottom // self.cell_size), int(top // self.cell_size))
+
+    def cells_in_range(self, cell_range):
+        min_x, max_x, min_y, max_y = cell_range
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                yield cell_x, cell_y
+
+    def add(self, sprite: arcade.Sprite):
+        cell_range = self.cell_range(*sprite_bounds(sprite))
+        self.sprite_cells[sprite] = cell_range
+        for cell in self.cells_in_range(cell_range):
+            self.cells[cell].add(sprite)
+
+    def remove(self, sprite: arcade.Sprite):
+        cell_range = self.sprite_cells.pop(sprite, None)
+        if cell_range is None:
+            return
+
+        for cell in self.cells_in_range(cell_range):
+            bucket = self.cells[cell]
+            bucket.discard(sprite)
+            if not bucket:
+                del self.cells[cell]
+
+    def update(self, sprite: arcade.Sprite):
+        """ Re-bucket a sprite, does nothing if it stayed in the same cells. """
+        cell_range = self.cell_range(*sprite_bounds(sprite))
+        if self.sprite_cells.get(sprite) == cell_range:
+            return
+
+        self.remove(sprite)
+        self.add(sprite)
+
+    def update_all(self, sprites):
+        for sprite in sprites:
+            self.update(sprite)
+
+    def update_moved(self, sprites: arcade.SpriteList, positions):
+        """ Like update_all, but only for the sprites whose row in positions,
+        an (N, 2) array of where the sprites are, changed since the last call.
+        """
+        last = self.last_positions.get(sprites)
+        if last is None or last.shape != positions.shape:
+            moved = range(len(sprites))
+        else:
+            moved = np.flatnonzero(np.any(positions != last, axis=1)).tolist()
+        self.last_positions[sprites] = positions.copy()
+
+        for index in moved:
+            self.update(sprites[index])
+
+    def query(self, rect):
+        """ All sprites overlapping the (left, right, bottom, top) rect. """
+        found = set()
+        for cell in self.cells_in_range(self.cell_range(*rect)):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+
+        return {sprite for sprite in found if overlaps(sprite_bounds(sprite), rect)}
+
+
+class VisibleSet:
+    def __init__(self, sources=()):
+        """ sources are the sprite lists the visible sprites are drawn from,
+        in the order they should be drawn.
+        """
+        self.sprites = arcade.SpriteList()
+        # A dict rather than a set, it keeps the order the sprites were added in
+        self.members = {}
+        self.rank = {sprite: rank for rank, sprite in enumerate(itertools.chain(*sources))}
+
+    def update(self, visible):
+        for sprite in self.members.keys() - visible:
+            self.sprites.remove(sprite)
+        members = {sprite: None for sprite in self.members if sprite in visible}
+
+        # visible is a set, sort what came into view so its order does not vary
+        unranked = len(self.rank)
+        entered = sorted(visible - members.keys(),
+                         key=lambda sprite: self.rank.get(sprite, unranked))
+        for sprite in entered:
+            self.sprites.append(sprite)
+            members[sprite] = None
+        self.members = members
+
+    def draw(self):
+        self.sprites.draw()
@@ -0,0 +1,76 @@
+""" Floating origin for very large worlds.
+
+Sprite positions, Pymunk bodies and cameras are all single or double precision
+floats, and the GPU works in float32. The further from the origin the followed
+entity gets, the coarser the positions become until the ships visibly jitter
+(see camera_zoom/precision_report.py for the numbers).
+
+Once the followed entity passes the rebase distance the whole world is shifted
+back so that it sits near the origin again. Everything is shifted together in
+one pass: the Pymunk bodies, the sprite lists and anything else that registered
+a listener, such as cameras, interpolation state and the background. Between
+rebases this costs nothing per frame beyond one comparison.
+
+Shifts are snapped to a multiple of REBASE_SNAP, so most world coordinates
+only lose their high bits and shift exactly.
+"""
+
+DEFAULT_REBASE_DISTANCE = 20000.0
+REBASE_SNAP = 1024.0
+
+
+class FloatingOrigin:
+    def __init__(self, space=None, rebase_distance=DEFAULT_REBASE_DISTANCE):
+        """ space can be None when the bodies live somewhere else, such as a
+        physics process, and only the listeners need shifting.
+        """
+        self.space = space
+        self.rebase_distance = rebase_distance
+        self.sprite_lists = []
+        self.listeners = []
+
+        # Where the current origin is, in absolute world coordinates
+        self.origin = (0.0, 0.0)
+        self.rebases = 0
+
+    def add_sprite_list(self, sprite_list):
+        self.sprite_lists.append(sprite_list)
+
+    def add_listener(self, listener):
+        """ listener(dx, dy) is called with the shift of every rebase. """
+        self.listeners.append(listener)
+
+    def to_absolute(self, x, y):
+        return x + self.origin[0], y + self.origin[1]
+
+    def check(self, x, y):
+        """ Rebase if (x, y) is too far from the origin. Returns True if it did. """
+        if abs(x) < self.rebase_distance and abs(y) < self.rebase_distance:
+            return False
+
+        self.rebase(round(x / REBASE_SNAP) * REBASE_SNAP,
+                    round(y / REBASE_SNAP) * REBASE_SNAP)
+        return True
+
+    def rebase(self, x, y):
+        """ Move the origin to (x, y), shifting the whole world by (-x, -y). """
+        dx, dy = -x, -y
+
+        if self.space is not None:
+            for body in self.space.bodies:
+                position = body.position
+                body.position = position.x + dx, position.y + dy
+
+            static_body = self.space.static_body
+            if static_body.shapes:
+                static_body.position = static_body.position.x + dx, static_body.position.y + dy
+                self.space.reindex_static()
+
+        for sprite_list in self.sprite_lists:
+            sprite_list.move(dx, dy)
+
+        for listener in self.listeners:
+            listener(dx, dy)
+
+        self.origin = (self.origin[0] + x, self.origin[1] + y)
+        self.rebases += 1
@@ -0,0 +1,143 @@
+import pyglet
+
+""" Event driven keyboard and controller input for multiple players.
+
+Every player gets a PlayerInput, a small slotted struct holding the current
+state of their keys, sticks and buttons. Nothing is polled: key presses are
+routed through a lookup table of bindings and controller events update the
+struct of the player that controller is assigned to. Reading the input in the
+update loop is then just reading a few attributes.
+
+Controllers are enumerated once when the manager is created. Controllers
+plugged in later are given to the first player without one. Unplugging a
+controller hands its player a spare one that is still connected, if there is
+one, and frees the player up otherwise.
+"""
+
+STICK_DEAD_ZONE = 0.15
+
+BUTTON_BITS = {"a": 0, "b": 1, "x": 2, "y": 3,
+               "leftshoulder": 4, "rightshoulder": 5,
+               "start": 6, "back": 7,
+               "leftstick": 8, "rightstick": 9}
+
+
+class PlayerInput:
+    __slots__ = ("up", "down", "left", "right", "rotate_left", "rotate_right",
+                 "stick_x", "stick_y", "stick_rotation", "buttons", "controller")
+
+    def __init__(self):
+        self.up = 0.0
+        self.down = 0.0
+        self.left = 0.0
+        self.right = 0.0
+        self.rotate_left = 0.0
+        self.rotate_right = 0.0
+        self.stick_x = 0.0
+        self.stick_y = 0.0
+        self.stick_rotation = 0.0
+        self.buttons = 0
+        self.controller = None
+
+    @property
+    def thrust_x(self):
+        return max(-1.0, min(1.0, self.right - self.left + self.stick_x))
+
+    @property
+    def thrust_y(self):
+        return max(-1.0, min(1.0, self.up - self.down + self.stick_y))
+
+    @property
+    def rotation(self):
+        return max(-1.0, min(1.0, self.rotate_left - self.rotate_right - self.stick_rotation))
+
+    def button(self, name):
+        return bool(self.buttons & (1 << BUTTON_BITS[name]))
+
+    def clear_controller(self):
+        self.stick_x = 0.0
+        self.stick_y = 0.0
+        self.stick_rotation = 0.0
+        self.buttons = 0
+        self.controller = None
+
+
+def dead_zone(value):
+    return 0.0 if abs(value) < STICK_DEAD_ZONE else value
+
+
+class InputManager:
+    def __init__(self, player_count, bindings):
+        """ bindings maps a key to a (player, field) pair, e.g.
+        {arcade.key.W: (PLAYER_ONE, "up")}
+        """
+        self.players = [PlayerInput() for _ in range(player_count)]
+        self.bindings = bindings
+
+        self.controller_manager = pyglet.input.ControllerManager()
+        self.controller_manager.push_handlers(self)
+        for controller in self.controller_manager.get_controllers():
+            self.on_connect(controller)
+
+    def player_for(self, controller):
+        for player in self.players:
+            if player.controller is controller:
+                return player
+        return None
+
+    def on_key_press(self, key: int, modifiers: int):
+        binding = self.bindings.get(key)
+        if binding is not None:
+            setattr(self.players[binding[0]], binding[1], 1.0)
+
+    def on_key_release(self, key: int, modifiers: int):
+        binding = self.bindings.get(key)
+        if binding is not None:
+            setattr(self.players[binding[0]], binding[1], 0.0)
+
+    def assign(self, player, controller):
+        controller.open()
+        controller.push_handlers(self)
+        player.controller = controller
+
+    def on_connect(self, controller):
+        for player in self.players:
+            if player.controller is None:
+                self.assign(player, controller)
+                return
+
+    def on_disconnect(self, controller):
+        player = self.player_for(controller)
+        if player is None:
+            return
+        controller.remove_handlers(self)
+        player.clear_controller()
+
+        # A controller connected while every player had one is spare until now
+        for spare in self.controller_manager.get_controllers():
+            if spare is not controller and self.player_for(spare) is None:
+                self.assign(player, spare)
+                return
+
+    def on_stick_motion(self, controller, stick, *values):
+        player = self.player_for(controller)
+        if player is None:
+            return
+
+        # pyglet 2.0 passes x and y, pyglet 2.1 passes a single Vec2
+        x, y = values if len(values) == 2 else values[0]
+        if stick == "leftstick":
+            player.stick_x = dead_zone(x)
+            player.stick_y = dead_zone(y)
+        elif stick == "rightstick":
+            player.stick_rotation = dead_zone(x)
+
+    def on_button_press(self, controller, button):
+        player = self.player_for(controller)
+        if player is not None and button in BUTTON_BITS:
+            player.buttons |= 1 << BUTTON_BITS[button]
+
+    def on_button_release(self, controller, button):
+        player = self.player_for(controller)
+        if player is not None and button in BUTTON_BITS:
+            player.buttons &= ~(1 << BUTTON_BITS[button])
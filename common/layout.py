@@ -0,0 +1,86 @@
+import math
+import time
+
+""" Split screen layout for any number of viewports.
+
+The window is divided into a grid, a single row or a single column of
+viewports, and the existing cameras are re-pointed at them instead of being
+recreated. Dragging a window edge fires a burst of resize events, so resizes
+are only recorded and the layout pass runs once the window has stopped
+changing size for the debounce time.
+"""
+
+GRID = "grid"
+ROW = "row"
+COLUMN = "column"
+
+DEFAULT_DEBOUNCE = 0.15
+
+
+def split(length, parts):
+    """ Integer edges that split length into parts without gaps. """
+    return [length * i // parts for i in range(parts + 1)]
+
+
+def compute_viewports(arrangement, count, width, height):
+    """ Viewports as (left, bottom, width, height), the first one is top left. """
+    if count <= 0:
+        return []
+
+    if arrangement == ROW:
+        columns, rows = count, 1
+    elif arrangement == COLUMN:
+        columns, rows = 1, count
+    elif arrangement == GRID:
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+    else:
+        raise ValueError(f"Unknown layout arrangement: {arrangement}")
+
+    x_edges = split(width, columns)
+    y_edges = split(height, rows)
+
+    viewports = []
+    for index in range(count):
+        column = index % columns
+        # Rows are counted from the top of the window
+        row = rows - 1 - index // columns
+        viewports.append((x_edges[column], y_edges[row],
+                          x_edges[column + 1] - x_edges[column],
+                          y_edges[row + 1] - y_edges[row]))
+
+    return viewports
+
+
+class SplitScreenLayout:
+    def __init__(self, cameras, arrangement=ROW, debounce=DEFAULT_DEBOUNCE):
+        self.cameras = cameras
+        self.arrangement = arrangement
+        self.debounce = debounce
+        self.viewports = []
+        self.pending_size = None
+        self.last_resize = 0.0
+
+    def apply(self, width, height):
+        self.viewports = compute_viewports(self.arrangement, len(self.cameras), width, height)
+        for camera, viewport in zip(self.cameras, self.viewports):
+            camera.viewport = viewport
+            camera.equalise()
+
+        self.pending_size = None
+
+    def on_resize(self, width, height):
+        self.pending_size = (width, height)
+        self.last_resize = time.perf_counter()
+
+    def update(self):
+        """ Run the layout pass if a resize burst has settled. Returns True if
+        the viewports changed.
+        """
+        if self.pending_size is None:
+            return False
+        if time.perf_counter() - self.last_resize < self.debounce:
+            return False
+
+        self.apply(*self.pending_size)
+        return True
@@ -0,0 +1,163 @@
+from array import array
+
+import numpy as np
+import arcade
+from arcade.gl import BufferDescription
+
+from common.render_targets import Blitter
+
+""" An overview map that is redrawn rarely and blitted every frame.
+
+Drawing an overview with another Camera2D would draw every sprite again, at
+full rate. The Minimap instead draws one small square marker per entity into
+its own small framebuffer. Every layer of markers is a single instanced draw
+call, the positions are packed into one float32 buffer per layer.
+
+The framebuffer is redrawn at most refresh_rate times a second, and then only
+if something moved more than move_threshold minimap pixels since it was last
+drawn. Every other frame costs a single textured quad.
+"""
+
+DEFAULT_SIZE = (200, 200)
+DEFAULT_REFRESH_RATE = 4.0
+DEFAULT_MOVE_THRESHOLD = 2.0
+DEFAULT_MARKER_SIZE = 3.0
+MINIMAP_BACKGROUND = (0, 0, 0, 160)
+
+MARKER_VERTEX_SHADER = """
+#version 330
+
+in vec2 in_vert;
+in vec2 in_position;
+
+// left, bottom, width, height of the world the map shows
+uniform vec4 world_rect;
+// Marker size in normalized device coordinates
+uniform vec2 marker_size;
+
+void main() {
+    vec2 position = (in_position - world_rect.xy) / world_rect.zw * 2.0 - 1.0;
+    gl_Position = vec4(position + in_vert * marker_size, 0.0, 1.0);
+}
+"""
+
+MARKER_FRAGMENT_SHADER = """
+#version 330
+
+uniform vec4 color;
+
+out vec4 fragColor;
+
+void main() {
+    fragColor = color;
+}
+"""
+
+
+class MarkerLayer:
+    """ One color of markers, positions comes from a function returning an (N, 2) array. """
+
+    def __init__(self, ctx: arcade.ArcadeContext, quad, positions, color, marker_size):
+        self.positions = positions
+        self.color = arcade.types.Color.from_iterable(color).normalized
+        self.marker_size = marker_size
+        self.count = 0
+        self.drawn = np.empty((0, 2))
+        self.buffer = ctx.buffer(reserve=8 * 64, usage="dynamic")
+        self.geometry = ctx.geometry([BufferDescription(quad, "2f", ["in_vert"]),
+                                      BufferDescription(self.buffer, "2f", ["in_position"],
+                                                        instanced=True)],
+                                     mode=ctx.TRIANGLE_STRIP)
+
+    def moved(self, positions, threshold):
+        if positions.shape != self.drawn.shape:
+            return True
+        return positions.size and np.abs(positions - self.drawn).max() > threshold
+
+    def upload(self, positions):
+        data = np.ascontiguousarray(positions, dtype=np.float32)
+        if data.nbytes > self.buffer.size:
+            self.buffer.orphan(size=max(data.nbytes, self.buffer.size * 2))
+        if data.nbytes:
+            self.buffer.write(data)
+        self.count = len(data)
+        self.drawn = np.array(positions, dtype=np.float64)
+
+
+class Minimap:
+    def __init__(self, ctx: arcade.ArcadeContext,
+                 world_size,
+                 size=DEFAULT_SIZE,
+                 refresh_rate=DEFAULT_REFRESH_RATE,
+                 move_threshold=DEFAULT_MOVE_THRESHOLD):
+        self.ctx = ctx
+        self.world_size = world_size
+        self.size = size
+        self.refresh_rate = refresh_rate
+        self.move_threshold = move_threshold
+
+        self.texture = ctx.texture(size, filter=(ctx.LINEAR, ctx.LINEAR))
+        self.framebuffer = ctx.framebuffer(color_attachments=[self.texture])
+        self.program = ctx.program(vertex_shader=MARKER_VERTEX_SHADER,
+                                   fragment_shader=MARKER_FRAGMENT_SHADER)
+        self.quad = ctx.buffer(data=array("f", [-0.5, 0.5, -0.5, -0.5, 0.5, 0.5, 0.5, -0.5]))
+        self.layers = []
+
+        self.center = None
+        self.since_refresh = 0.0
+        self.refreshes = 0
+
+    def add_layer(self, positions, color, marker_size=DEFAULT_MARKER_SIZE):
+        """ positions is called every frame and should return an (N, 2) array
+        of world positions, cheaply.
+        """
+        layer = MarkerLayer(self.ctx, self.quad, positions, color, marker_size)
+        self.layers.append(layer)
+        return layer
+
+    @property
+    def units_per_pixel(self):
+        return self.world_size[0] / self.size[0], self.world_size[1] / self.size[1]
+
+    def update(self, delta_time, center):
+        """ Redraw the map around center if it is due and something moved.
+        Returns True if it was redrawn.
+        """
+        self.since_refresh += delta_time
+        if self.center is not None and self.since_refresh < 1.0 / self.refresh_rate:
+            return False
+        # Checking is the costly part, so it waits for the next interval either way
+        self.since_refresh = 0.0
+
+        threshold = self.move_threshold * min(self.units_per_pixel)
+        positions = [layer.positions() for layer in self.layers]
+        if self.center is not None and not (
+                max(abs(center[0] - self.center[0]), abs(center[1] - self.center[1])) > threshold or
+                any(layer.moved(layer_positions, threshold)
+                    for layer, layer_positions in zip(self.layers, positions))):
+            return False
+
+        self.center = tuple(center)
+        for layer, layer_positions in zip(self.layers, positions):
+            layer.upload(layer_positions)
+        self.render()
+        self.refreshes += 1
+        return True
+
+    def render(self):
+        width, height = self.world_size
+        with self.framebuffer.activate():
+            self.framebuffer.clear(color=MINIMAP_BACKGROUND)
+            self.program["world_rect"] = (self.center[0] - width / 2, self.center[1] - height / 2,
+                                          width, height)
+            for layer in self.layers:
+                if not layer.count:
+                    continue
+                self.program["marker_size"] = (layer.marker_size * 2 / self.size[0],
+                                               layer.marker_size * 2 / self.size[1])
+                self.program["color"] = layer.color
+                layer.geometry.render(self.program, vertices=4, instances=layer.count)
+
+    def draw(self, blitter: Blitter, viewport):
+        """ Blit the cached map into viewport of the active framebuffer. """
+        blitter.blit(self.texture, viewport)
@@ -0,0 +1,88 @@
+import statistics
+import time
+from typing import NamedTuple, Optional
+
+import arcade
+import pymunk
+
+""" Tuning for the Pymunk space behind arcade's PymunkPhysicsEngine.
+
+The engine is created with Pymunk's defaults: a bounding box tree broadphase,
+no sleeping and 10 solver iterations. For thousands of mostly idle ships a
+spatial hash broadphase, sized from the sprites themselves, and letting idle
+bodies fall asleep makes the step cost follow the number of active bodies.
+
+Sleeping bodies are woken by anything that touches their velocity or force, so
+code driving bodies should leave idle ones alone.
+"""
+
+# Pymunk recommends about 10 hash cells per shape
+HASH_CELLS_PER_SHAPE = 10
+STEP_HISTORY = 600
+
+
+class PhysicsConfig(NamedTuple):
+    iterations: int = 10
+    # Seconds a body has to be idle before it sleeps, None disables sleeping
+    sleep_time_threshold: Optional[float] = 0.5
+    # Speed under which a body counts as idle, 0 lets Pymunk pick one from gravity
+    idle_speed_threshold: float = 1.0
+    use_spatial_hash: bool = True
+    # None sizes the hash cells from the sprites
+    cell_size: Optional[float] = None
+
+
+def shape_size(sprite):
+    """ The larger extent of the shape Pymunk gets for sprite, its scaled hit
+    box rather than the texture, which can have a lot of empty margin.
+    """
+    xs = [x for x, _ in sprite.hit_box.points]
+    ys = [y for _, y in sprite.hit_box.points]
+    return max(max(xs) - min(xs), max(ys) - min(ys)) * sprite.scale
+
+
+def auto_cell_size(sprite_lists):
+    """ The average size of the shapes, a good spatial hash cell size. """
+    sizes = [shape_size(sprite) for sprite_list in sprite_lists for sprite in sprite_list]
+    return statistics.fmean(sizes) if sizes else 100.0
+
+
+def configure_space(space: pymunk.Space, config: PhysicsConfig, sprite_lists=()):
+    space.iterations = config.iterations
+    space.idle_speed_threshold = config.idle_speed_threshold
+    space.sleep_time_threshold = (config.sleep_time_threshold
+                                  if config.sleep_time_threshold is not None else float("inf"))
+
+    if config.use_spatial_hash:
+        cell_size = config.cell_size or auto_cell_size(sprite_lists)
+        shape_count = max(len(space.shapes), 1)
+        space.use_spatial_hash(cell_size, shape_count * HASH_CELLS_PER_SHAPE)
+
+
+class StepTimer:
+    def __init__(self, history=STEP_HISTORY):
+        self.history = history
+        self.times = []
+        self.steps = 0
+
+    def step(self, engine: arcade.PymunkPhysicsEngine, delta_time, resync_sprites=True):
+        start = time.perf_counter()
+        engine.step(delta_time=delta_time, resync_sprites=resync_sprites)
+        elapsed = time.perf_counter() - start
+
+        self.steps += 1
+        if len(self.times) < self.history:
+            self.times.append(elapsed)
+        else:
+            self.times[self.steps % self.history] = elapsed
+
+    def summary(self, space):
+        active = sum(1 for body in space.bodies if not body.is_sleeping)
+        if not self.times:
+            return f"{self.steps} steps, {active}/{len(space.bodies)} bodies awake"
+
+        times = sorted(self.times)
+        return (f"{self.steps} steps, mean {statistics.fmean(times) * 1000:.3f} ms, "
+                f"p95 {times[len(times) * 95 // 100] * 1000:.3f} ms, "
+                f"max {times[-1] * 1000:.3f} ms, "
+                f"{active}/{len(space.bodies)} bodies awake")
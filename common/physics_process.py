@@ -0,0 +1,416 @@
+import math
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+import pymunk
+
+from common.physics_config import PhysicsConfig, configure_space
+from common.swarm import ShipSwarm, turn_body
+from common.floating_origin import FloatingOrigin
+
+""" Runs the Pymunk world in a worker process.
+
+The worker builds its own space from a WorldSpec, steps it at a fixed rate and
+publishes every body's x, y, angle and velocities to a double-buffered array in
+shared memory. It always writes the buffer that is not published and then
+bumps the sequence counter, so the latest snapshot is buffer sequence % 2. The
+render loop reads that buffer in place, computing the extrapolated positions
+straight from it, and checks the sequence again afterwards. The writer starts
+on that same buffer as soon as it publishes the next snapshot, so if the
+sequence changed at all the read may be torn and it is simply done again.
+
+The render loop sends player input back through a single producer, single
+consumer ring in shared memory. Only the producer writes the head and only the
+consumer writes the tail, so neither side ever takes a lock.
+
+Sprites are drawn at the snapshot's position moved on by its velocity for the
+time since the snapshot was taken, so they move smoothly between steps. The
+worker also owns the floating origin and publishes the origin with every
+snapshot, so the render loop can shift its cameras and background to match.
+"""
+
+# Per body columns of a snapshot, angles in arcade's clockwise degrees
+X, Y, ANGLE, VELOCITY_X, VELOCITY_Y, ANGULAR_VELOCITY = range(6)
+STATE_FIELDS = 6
+
+# Header fields, sequence is 0 until the first snapshot is published
+SEQUENCE, RUNNING, STEPS, STEP_TIME = range(4)
+HEADER_FIELDS = 4
+
+# Per buffer stamp fields
+STAMP_TIME, STAMP_ORIGIN_X, STAMP_ORIGIN_Y = range(3)
+STAMP_FIELDS = 3
+
+# Ring records set the input of one player: index, thrust x, thrust y, rotation
+RING_FIELDS = 4
+DEFAULT_RING_CAPACITY = 256
+
+START_TIMEOUT = 30.0
+STOP_TIMEOUT = 2.0
+
+
+class BodySpec(NamedTuple):
+    position: Tuple[float, float]
+    mass: float
+    moment: float
+    points: tuple
+    friction: float
+    elasticity: float
+    angle: float = 0.0
+
+
+class SwarmSpec(NamedTuple):
+    positions: np.ndarray
+    size: Tuple[float, float]
+    active: np.ndarray
+    seed: int
+    mass: float
+    thrust_force: float
+    rotation_force: float
+    elasticity: float
+    friction: float
+
+
+class WorldSpec(NamedTuple):
+    rate: int
+    substeps: int
+    max_steps: int
+    damping: float
+    config: PhysicsConfig
+    players: tuple
+    swarm: Optional[SwarmSpec] = None
+    rebase_distance: Optional[float] = None
+
+    @property
+    def body_count(self):
+        return len(self.players) + (len(self.swarm.positions) if self.swarm else 0)
+
+
+def body_spec(sprite, mass, moment, friction, elasticity):
+    """ The same body PymunkPhysicsEngine.add_sprite would make for sprite. """
+    points = tuple((x * sprite.scale, y * sprite.scale) for x, y in sprite.hit_box.points)
+    return BodySpec(tuple(sprite.position), mass, moment, points, friction, elasticity, sprite.angle)
+
+
+class SharedState:
+    """ The snapshot buffers, seen from either process. """
+
+    def __init__(self, body_count, name=None):
+        size = 8 * (HEADER_FIELDS + 2 * STAMP_FIELDS + 2 * body_count * STATE_FIELDS)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.owner = name is None
+
+        data = np.ndarray(size // 8, dtype=np.float64, buffer=self.shm.buf)
+        stamps_start = HEADER_FIELDS
+        states_start = stamps_start + 2 * STAMP_FIELDS
+        self.header = data[:stamps_start]
+        self.stamps = data[stamps_start:states_start].reshape(2, STAMP_FIELDS)
+        self.states = data[states_start:].reshape(2, body_count, STATE_FIELDS)
+        if self.owner:
+            data[:] = 0.0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        # The views have to go before the mapping can be closed
+        self.header = self.stamps = self.states = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class InputRing:
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY, name=None):
+        size = 16 + 8 * capacity * RING_FIELDS
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.owner = name is None
+        self.capacity = capacity
+
+        # head is only written by the producer, tail only by the consumer
+        self.indices = np.ndarray(2, dtype=np.int64, buffer=self.shm.buf)
+        self.records = np.ndarray((capacity, RING_FIELDS), dtype=np.float64,
+                                  buffer=self.shm.buf, offset=16)
+        if self.owner:
+            self.indices[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def push(self, record):
+        """ Returns False if the ring is full and the record was dropped. """
+        head, tail = int(self.indices[0]), int(self.indices[1])
+        if head - tail >= self.capacity:
+            return False
+        self.records[head % self.capacity] = record
+        self.indices[0] = head + 1
+        return True
+
+    def pop_all(self):
+        head, tail = int(self.indices[0]), int(self.indices[1])
+        records = [self.records[index % self.capacity].tolist() for index in range(tail, head)]
+        self.indices[1] = head
+        return records
+
+    def close(self):
+        self.indices = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class PhysicsWorker:
+    """ The worker process side: the space, its bodies and the step loop. """
+
+    def __init__(self, world: WorldSpec, state: SharedState, ring: InputRing):
+        self.world = world
+        self.state = state
+        self.ring = ring
+        self.space = pymunk.Space()
+        self.space.damping = world.damping
+
+        self.players = []
+        for spec in world.players:
+            body = pymunk.Body(spec.mass, spec.moment)
+            body.position = spec.position
+            body.angle = -math.radians(spec.angle)
+            shape = pymunk.Poly(body, spec.points)
+            shape.friction = spec.friction
+            shape.elasticity = spec.elasticity
+            self.space.add(body, shape)
+            self.players.append(body)
+        # thrust x, thrust y and rotation of every player
+        self.controls = np.zeros((len(self.players), 3))
+
+        self.swarm = None
+        self.rng = None
+        if world.swarm:
+            swarm = world.swarm
+            self.rng = np.random.default_rng(swarm.seed)
+            self.swarm = ShipSwarm(None, self.space,
+                                   mass=swarm.mass,
+                                   thrust_force=swarm.thrust_force,
+                                   rotation_force=swarm.rotation_force,
+                                   elasticity=swarm.elasticity,
+                                   friction=swarm.friction,
+                                   active=swarm.active,
+                                   positions=swarm.positions.tolist(),
+                                   size=swarm.size)
+        self.bodies = self.players + (self.swarm.bodies if self.swarm else [])
+        self.latest = np.zeros((len(self.bodies), STATE_FIELDS))
+
+        configure_space(self.space, world.config)
+
+        self.floating_origin = None
+        if world.rebase_distance and self.players:
+            self.floating_origin = FloatingOrigin(self.space, world.rebase_distance)
+            if self.swarm:
+                self.floating_origin.add_listener(self.swarm.shift)
+
+        self.step_time = 1.0 / world.rate
+        self.substep_time = self.step_time / world.substeps
+        self.steps = 0
+        self.busy_time = 0.0
+
+    def read_input(self):
+        for index, thrust_x, thrust_y, rotation in self.ring.pop_all():
+            self.controls[int(index)] = thrust_x, thrust_y, rotation
+
+    def apply_rotation(self):
+        # The same damping and turning as Player.on_update
+        for body, rotation in zip(self.players, self.controls[:, 2].tolist()):
+            turn_body(body, rotation, self.step_time)
+
+    def step(self):
+        start = time.perf_counter()
+        self.read_input()
+        self.apply_rotation()
+        if self.swarm:
+            self.swarm.wander(self.rng)
+            self.swarm.apply_rotation(self.step_time)
+
+        thrusts = self.controls[:, :2].tolist()
+        for _ in range(self.world.substeps):
+            for body, (thrust_x, thrust_y) in zip(self.players, thrusts):
+                if thrust_x or thrust_y:
+                    body.apply_force_at_world_point((thrust_x, thrust_y), body.position)
+            if self.swarm:
+                self.swarm.apply_thrust()
+            self.space.step(self.substep_time)
+
+        if self.floating_origin:
+            position = self.players[0].position
+            self.floating_origin.check(position.x, position.y)
+
+        self.steps += 1
+        self.busy_time += time.perf_counter() - start
+
+    def publish(self):
+        state = self.state
+        sequence = int(state.header[SEQUENCE])
+        back = (sequence + 1) % 2
+
+        # Sleeping bodies have not moved since they were last read, so only
+        # the awake ones are read out of Pymunk
+        awake = [index for index, body in enumerate(self.bodies) if not body.is_sleeping]
+        values = np.fromiter((value for index in awake
+                              for body in (self.bodies[index],)
+                              for value in (*body.position, body.angle,
+                                            *body.velocity, body.angular_velocity)),
+                             dtype=np.float64, count=len(awake) * STATE_FIELDS)
+        values = values.reshape(len(awake), STATE_FIELDS)
+        # Arcade angles are clockwise degrees, Pymunk's are counter clockwise radians
+        values[:, ANGLE] = -np.degrees(values[:, ANGLE])
+        values[:, ANGULAR_VELOCITY] = -np.degrees(values[:, ANGULAR_VELOCITY])
+        self.latest[awake] = values
+        state.states[back] = self.latest
+
+        origin = self.floating_origin.origin if self.floating_origin else (0.0, 0.0)
+        state.stamps[back] = time.perf_counter(), origin[0], origin[1]
+        state.header[STEPS] = self.steps
+        state.header[STEP_TIME] = self.busy_time / self.steps if self.steps else 0.0
+        state.header[SEQUENCE] = sequence + 1
+
+    def run(self):
+        self.publish()
+        next_step = time.perf_counter()
+        while self.state.header[RUNNING]:
+            now = time.perf_counter()
+            if now < next_step:
+                time.sleep(next_step - now)
+                continue
+
+            self.step()
+            self.publish()
+            next_step += self.step_time
+            # Drop the time it can not catch up on, like FixedTimestep does
+            if now - next_step > self.world.max_steps * self.step_time:
+                next_step = now
+
+
+def run_physics(world: WorldSpec, state_name, ring_name, ring_capacity):
+    state = SharedState(world.body_count, state_name)
+    ring = InputRing(ring_capacity, ring_name)
+    try:
+        PhysicsWorker(world, state, ring).run()
+    finally:
+        state.close()
+        ring.close()
+
+
+class PhysicsProcess:
+    """ The render loop side: starts the worker, sends input, syncs sprites. """
+
+    def __init__(self, world: WorldSpec, ring_capacity=DEFAULT_RING_CAPACITY):
+        self.world = world
+        self.step_time = 1.0 / world.rate
+        self.state = SharedState(world.body_count)
+        self.ring = InputRing(ring_capacity)
+        self.sent = {}
+        # x, y and angle of every body as sync last placed the sprites
+        self.rendered = np.zeros((world.body_count, 3))
+
+        self.state.header[RUNNING] = 1.0
+        # Spawn everywhere, a forked child would inherit the window and GL context
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(target=run_physics,
+                                       args=(world, self.state.name, self.ring.name,
+                                             ring_capacity),
+                                       name="physics",
+                                       daemon=True)
+        self.process.start()
+
+    def starting(self, timeout=START_TIMEOUT):
+        """ Yields until the worker published its first snapshot, so a loading
+        screen can keep drawing while the worker builds its world.
+        """
+        deadline = time.perf_counter() + timeout
+        while self.state.header[SEQUENCE] == 0:
+            if not self.process.is_alive():
+                raise RuntimeError("The physics process exited before it started")
+            if time.perf_counter() > deadline:
+                raise TimeoutError("The physics process did not start in time")
+            yield
+
+    def wait_ready(self, timeout=START_TIMEOUT):
+        """ Block until the worker published its first snapshot. """
+        for _ in self.starting(timeout):
+            time.sleep(0.001)
+
+    def send_input(self, index, thrust_x, thrust_y, rotation):
+        """ Queue the input of player index, only if it changed. """
+        record = (index, thrust_x, thrust_y, rotation)
+        if self.sent.get(index) == record:
+            return
+        if self.ring.push(record):
+            self.sent[index] = record
+
+    def read(self, reader):
+        """ Call reader with the states and stamp of the latest snapshot, the
+        published buffers themselves rather than copies, and return what it
+        returns. Whatever reader keeps must not be a view of them.
+        """
+        header = self.state.header
+        while True:
+            sequence = int(header[SEQUENCE])
+            result = reader(self.state.states[sequence % 2], self.state.stamps[sequence % 2])
+            # Once the next snapshot is published the worker rewrites this buffer
+            if int(header[SEQUENCE]) == sequence:
+                return result
+
+    @property
+    def origin(self):
+        return self.read(lambda states, stamp: (float(stamp[STAMP_ORIGIN_X]),
+                                                float(stamp[STAMP_ORIGIN_Y])))
+
+    def positions(self, start=0, stop=None):
+        """ The x and y columns of the latest snapshot. Copied, as callers keep
+        them after the worker has moved on to rewriting the buffer.
+        """
+        return self.read(lambda states, stamp: states[start:stop, X:ANGLE].copy())
+
+    def extrapolated(self):
+        """ Positions and angles of every body now, from the latest snapshot.
+        Returns the origin they are relative to with them.
+        """
+        def reader(states, stamp):
+            elapsed = min(max(time.perf_counter() - stamp[STAMP_TIME], 0.0), self.step_time)
+            result = np.empty((len(states), 3))
+            result[:, 0] = states[:, X] + states[:, VELOCITY_X] * elapsed
+            result[:, 1] = states[:, Y] + states[:, VELOCITY_Y] * elapsed
+            result[:, 2] = states[:, ANGLE] + states[:, ANGULAR_VELOCITY] * elapsed
+            return result, (float(stamp[STAMP_ORIGIN_X]), float(stamp[STAMP_ORIGIN_Y]))
+
+        return self.read(reader)
+
+    def sync(self, sprite_lists):
+        """ Move the sprites to the bodies, in the order the bodies were given
+        to the WorldSpec. Returns the origin the positions are relative to.
+        """
+        self.rendered, origin = self.extrapolated()
+        rows = iter(self.rendered.tolist())
+        for sprite_list in sprite_lists:
+            for sprite, (x, y, angle) in zip(sprite_list, rows):
+                sprite.position = x, y
+                sprite.angle = angle
+        return origin
+
+    def summary(self):
+        header = self.state.header
+        return (f"{int(header[STEPS])} steps in the physics process, "
+                f"mean {header[STEP_TIME] * 1000:.3f} ms")
+
+    def close(self):
+        if self.state.header is None:
+            return
+        self.state.header[RUNNING] = 0.0
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.state.close()
+        self.ring.close()
@@ -0,0 +1,195 @@
+import math
+
+import numpy as np
+import arcade
+from arcade.camera.projection_functions import (generate_view_matrix,
+                                                generate_orthographic_matrix)
+
+from common.culling import CullingGrid
+
+""" Mouse picking across split screen viewports.
+
+A window position is routed to the camera whose viewport contains it, later
+cameras win where viewports overlap as they are drawn on top, and is then
+unprojected with that camera's matrices. A click looks its candidates up in
+the CullingGrid the game already keeps up to date for culling, so it only
+looks at the sprites in one or two cells instead of every sprite in the world.
+
+A box selection can cover thousands of sprites, and gathering that many
+sprite objects out of the grid's buckets costs a Python step per sprite. So
+boxes are tested against an array of positions the caller already keeps, such
+as the swarm's interpolated state, in a few numpy passes, and the selection
+comes back as an array of indices. The corners of the screen rectangle are
+unprojected into a parallelogram, as the camera may be rotated, and a sprite
+is selected when its culling bounds overlap it.
+
+unproject_points routes and unprojects a whole (N, 2) array of window points
+at once.
+"""
+
+SELECTION_OUTLINE_COLOR = arcade.color.WHITE
+SELECTION_FILL_COLOR = (255, 255, 255, 32)
+
+
+def viewport_contains(viewport, x, y):
+    left, bottom, width, height = viewport
+    return left <= x < left + width and bottom <= y < bottom + height
+
+
+def inverse_matrix(camera: arcade.camera.Camera2D):
+    view = generate_view_matrix(camera.view_data)
+    projection = generate_orthographic_matrix(camera.projection_data, camera.zoom)
+    # pyglet's Mat4 is stored column major, numpy wants row major
+    return np.array(~(projection @ view), dtype=np.float64).reshape(4, 4).T
+
+
+def unproject(camera: arcade.camera.Camera2D, points):
+    """ Unproject an (N, 2) array of window points with camera to an (N, 2)
+    array of world points, the same way Camera2D.unproject does one point.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    m = inverse_matrix(camera)
+    left, bottom, width, height = camera.viewport
+
+    x = 2.0 * (points[:, 0] - left) / width - 1
+    y = 2.0 * (points[:, 1] - bottom) / height - 1
+    w = x * m[3, 0] + y * m[3, 1] + m[3, 3]
+
+    world = np.empty_like(points)
+    world[:, 0] = (x * m[0, 0] + y * m[0, 1] + m[0, 3]) / w
+    world[:, 1] = (x * m[1, 0] + y * m[1, 1] + m[1, 3]) / w
+    return world
+
+
+def overlap_on_axis(centers, half_sizes, quad, axis):
+    axis_x, axis_y = axis
+    corners = quad[:, 0] * axis_x + quad[:, 1] * axis_y
+    center = centers[:, 0] * axis_x + centers[:, 1] * axis_y
+    extent = half_sizes * (abs(axis_x) + abs(axis_y))
+    return (center + extent >= corners.min()) & (center - extent <= corners.max())
+
+
+def squares_overlap(centers, half_sizes, quad):
+    """ Indices of the squares, given by an (N, 2) array of centers and their
+    half sizes, that overlap the parallelogram quad, by separating axes.
+    """
+    edge_u = quad[1] - quad[0]
+    edge_v = quad[3] - quad[0]
+    indices = np.arange(len(centers))
+    # The axis aligned tests reject most squares, later axes only test the rest
+    for axis in ((1.0, 0.0), (0.0, 1.0), (-edge_u[1], edge_u[0]), (-edge_v[1], edge_v[0])):
+        keep = np.flatnonzero(overlap_on_axis(centers, half_sizes, quad, axis))
+        indices, centers, half_sizes = indices[keep], centers[keep], half_sizes[keep]
+    return indices
+
+
+class Picker:
+    def __init__(self, cameras, grid: CullingGrid, sprites: arcade.SpriteList, positions):
+        """ Only the sprites in sprites can be picked. positions is called for
+        every box selection and returns where they are drawn as an (N, 2)
+        array, in the same order, such as the array the swarm interpolates.
+        """
+        self.cameras = cameras
+        self.grid = grid
+        self.sprites = sprites
+        self.positions = positions
+        self.half_sizes = None
+
+    def camera_at(self, x, y):
+        """ Index of the camera drawn at window position (x, y), or None. """
+        for index in range(len(self.cameras) - 1, -1, -1):
+            if viewport_contains(self.cameras[index].viewport, x, y):
+                return index
+        return None
+
+    def to_world(self, x, y):
+        """ (camera index, (world x, world y)) for a window position, or None
+        outside every viewport.
+        """
+        index = self.camera_at(x, y)
+        if index is None:
+            return None
+        world = unproject(self.cameras[index], ((x, y),))[0]
+        return index, (float(world[0]), float(world[1]))
+
+    def unproject_points(self, points):
+        """ Route every window point of an (N, 2) array to its camera and
+        unproject it. Returns the camera index of every point, -1 outside every
+        viewport, and an (N, 2) array of world points, NaN outside.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        indices = np.full(len(points), -1, dtype=np.int64)
+        for index, camera in enumerate(self.cameras):
+            left, bottom, width, height = camera.viewport
+            inside = ((points[:, 0] >= left) & (points[:, 0] < left + width) &
+                      (points[:, 1] >= bottom) & (points[:, 1] < bottom + height))
+            indices[inside] = index
+
+        world = np.full(points.shape, np.nan)
+        for index, camera in enumerate(self.cameras):
+            routed = indices == index
+            if routed.any():
+                world[routed] = unproject(camera, points[routed])
+        return indices, world
+
+    def pick(self, x, y):
+        """ Index of the sprite under window position (x, y), the one closest
+        to the cursor if several overlap, or None.
+        """
+        hit = self.to_world(x, y)
+        if hit is None:
+            return None
+
+        _, (world_x, world_y) = hit
+        hits = [sprite for sprite in self.grid.query((world_x, world_x, world_y, world_y))
+                if self.sprites in sprite.sprite_lists and sprite.collides_with_point((world_x, world_y))]
+        if not hits:
+            return None
+        return self.sprites.index(min(
+            hits, key=lambda sprite: (sprite.center_x - world_x) ** 2 + (sprite.center_y - world_y) ** 2))
+
+    def box_select(self, start, end):
+        """ Indices of every sprite inside the window rectangle from start to
+        end. The rectangle belongs to the camera under start and is clipped to
+        its viewport.
+        """
+        index = self.camera_at(*start)
+        if index is None:
+            return np.empty(0, dtype=np.intp)
+
+        camera = self.cameras[index]
+        left, bottom, width, height = camera.viewport
+        x0, x1 = sorted(min(max(x, left), left + width) for x in (start[0], end[0]))
+        y0, y1 = sorted(min(max(y, bottom), bottom + height) for y in (start[1], end[1]))
+        quad = unproject(camera, ((x0, y0), (x1, y0), (x1, y1), (x0, y1)))
+        return self.select_quad(quad)
+
+    def select_quad(self, quad):
+        """ Indices of every sprite overlapping the world space parallelogram quad. """
+        positions = self.positions()
+        if self.half_sizes is None or len(self.half_sizes) != len(positions):
+            # The same bounds the culling grid uses, half the diagonal
+            self.half_sizes = np.array([math.hypot(sprite.width, sprite.height) / 2.0
+                                        for sprite in self.sprites])
+        return squares_overlap(positions, self.half_sizes, quad)
+
+
+class SelectionBox:
+    """ Draws the rectangle being dragged out, in window coordinates. """
+
+    def __init__(self):
+        self.camera = arcade.camera.Camera2D()
+        self.screen_size = None
+
+    def draw(self, start, end, width, height):
+        if self.screen_size != (width, height):
+            self.screen_size = (width, height)
+            self.camera.viewport = (0, 0, width, height)
+            self.camera.equalise()
+            self.camera.position = (width / 2, height / 2)
+
+        self.camera.use()
+        left, right = sorted((start[0], end[0]))
+        bottom, top = sorted((start[1], end[1]))
+        arcade.draw_lrbt_rectangle_filled(left, right, bottom, top, SELECTION_FILL_COLOR)
+        arcade.draw_lrbt_rectangle_outline(left, right, bottom, top, SELECTION_OUTLINE_COLOR)
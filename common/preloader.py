@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import arcade
+
+from common import texture_cache
+
+""" Background asset loading.
+
+Decoding PNGs and tracing hit boxes is pure CPU work that does not need the GL
+context, so the Preloader hands it to a thread pool as soon as it is created.
+Wrapping the decoded images in textures and uploading them to the texture atlas
+has to happen on the main thread, so upload() is called once a frame and only
+finishes a few textures each time. The window keeps drawing the LoadingScreen
+and never freezes, however many assets there are.
+
+Everything ends up in texture_cache, so the game's usual load_texture calls
+are cache hits once loading is done.
+
+Work that has to happen on the main thread, such as creating thousands of
+sprites and bodies, can be handed over as tasks. A task is a generator that
+does a batch of work per step and yields the fraction of it that is done. Once
+every asset is uploaded, upload() runs one step of a task per frame.
+"""
+
+DEFAULT_UPLOADS_PER_FRAME = 4
+LOADING_BAR_WIDTH = 400
+LOADING_BAR_HEIGHT = 20
+LOADING_FONT_SIZE = 14
+
+
+class Asset(NamedTuple):
+    resource: str
+    hit_box_algorithm: Optional[arcade.hitbox.HitBoxAlgorithm] = None
+    scale: float = 1.0
+
+
+class Preloader:
+    def __init__(self, assets, uploads_per_frame=DEFAULT_UPLOADS_PER_FRAME, workers=None,
+                 tasks=()):
+        self.assets = [Asset(*asset) for asset in assets]
+        self.uploads_per_frame = uploads_per_frame
+        self.uploaded = 0
+        self.tasks = list(tasks)
+        self.task_count = len(self.tasks)
+        self.task_progress = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preload")
+        self.pending = [(asset, self.executor.submit(texture_cache.decode, asset.resource,
+                                                     self.algorithm(asset)))
+                        for asset in self.assets]
+
+    @staticmethod
+    def algorithm(asset: Asset):
+        return asset.hit_box_algorithm or arcade.hitbox.algo_default
+
+    @property
+    def total(self):
+        return len(self.assets)
+
+    @property
+    def progress(self):
+        steps = self.total + self.task_count
+        if not steps:
+            return 1.0
+        finished_tasks = self.task_count - len(self.tasks)
+        return (self.uploaded + finished_tasks + self.task_progress) / steps
+
+    @property
+    def done(self):
+        return not self.pending and not self.tasks
+
+    def finish(self, asset: Asset, image, points):
+        texture, _ = texture_cache.create_texture(asset.resource, image, points,
+                                                  self.algorithm(asset), asset.scale)
+        arcade.get_window().ctx.default_atlas.add(texture)
+        self.uploaded += 1
+
+    def upload(self):
+        """ Upload up to uploads_per_frame decoded textures, in the order they
+        were asked for. Returns True once everything is loaded.
+        """
+        uploads = 0
+        while self.pending and uploads < self.uploads_per_frame:
+            asset, future = self.pending[0]
+            if not future.done():
+                break
+            # Decoding errors are raised here, on the main thread
+            self.finish(asset, *future.result())
+            self.pending.pop(0)
+            uploads += 1
+
+        # Tasks may use any of the textures, so they wait for all of them
+        if not self.pending and self.tasks:
+            self.step_task()
+
+        if self.done:
+            self.executor.shutdown(wait=False)
+        return self.done
+
+    def step_task(self):
+        try:
+            self.task_progress = next(self.tasks[0])
+        except StopIteration:
+            self.tasks.pop(0)
+            self.task_progress = 0.0
+
+    def wait(self):
+        """ Block until everything is loaded, for headless runs. """
+        for asset, future in self.pending:
+            self.finish(asset, *future.result())
+        self.pending = []
+        self.executor.shutdown()
+        while self.tasks:
+            self.step_task()
+
+
+class LoadingScreen:
+    def __init__(self, preloader: Preloader):
+        self.preloader = preloader
+        self.camera = arcade.camera.Camera2D()
+        self.screen_size = None
+        self.text = arcade.Text("", 0, 0, arcade.color.WHITE, LOADING_FONT_SIZE,
+                                anchor_x="center")
+
+    def draw(self, width, height):
+        if self.screen_size != (width, height):
+            self.screen_size = (width, height)
+            self.camera.viewport = (0, 0, width, height)
+            self.camera.equalise()
+            self.camera.position = (width / 2, height / 2)
+            self.text.x = width / 2
+            self.text.y = height / 2 + LOADING_BAR_HEIGHT
+
+        self.camera.use()
+        left = (width - LOADING_BAR_WIDTH) / 2
+        bottom = (height - LOADING_BAR_HEIGHT) / 2
+        arcade.draw_lrbt_rectangle_filled(left, left + LOADING_BAR_WIDTH * self.preloader.progress,
+                                          bottom, bottom + LOADING_BAR_HEIGHT,
+                                          arcade.color.WHITE)
+        arcade.draw_lrbt_rectangle_outline(left, left + LOADING_BAR_WIDTH,
+                                           bottom, bottom + LOADING_BAR_HEIGHT,
+                                           arcade.color.WHITE)
+
+        # Changing the text rebuilds its layout, so only do it when it changed
+        text = f"Loading {self.preloader.progress:.0%}"
+        if self.text.text != text:
+            self.text.text = text
+        self.text.draw()
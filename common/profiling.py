@@ -0,0 +1,112 @@
+import csv
+import time
+from array import array
+
+import arcade
+
+""" Per phase frame timing.
+
+The FrameProfiler keeps the time spent in every phase of the last N frames in
+one preallocated ring buffer, one row per frame. A phase can be entered more
+than once a frame (a fixed timestep update can run several times) and its
+times add up. When the profiler is disabled begin and end return straight
+away, so the calls can be left in the game loop.
+
+The ProfilerHUD draws p50/p95/p99 for every phase with arcade.Text objects
+that are created once and only have their text changed every few frames.
+"""
+
+DEFAULT_FRAMES = 600
+HUD_REFRESH_FRAMES = 30
+HUD_FONT_SIZE = 12
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    def __init__(self, phases, frames=DEFAULT_FRAMES, enabled=False):
+        self.phases = list(phases)
+        self.phase_index = {name: index for index, name in enumerate(self.phases)}
+        self.frames = frames
+        self.enabled = enabled
+
+        self.samples = array('d', bytes(8 * frames * len(self.phases)))
+        self.starts = [0.0] * len(self.phases)
+        self.frame = 0
+
+    def begin(self, phase):
+        if not self.enabled:
+            return
+        self.starts[self.phase_index[phase]] = time.perf_counter()
+
+    def end(self, phase):
+        if not self.enabled:
+            return
+        index = self.phase_index[phase]
+        row = (self.frame % self.frames) * len(self.phases)
+        self.samples[row + index] += time.perf_counter() - self.starts[index]
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame += 1
+        row = (self.frame % self.frames) * len(self.phases)
+        for index in range(len(self.phases)):
+            self.samples[row + index] = 0.0
+
+    def filled_rows(self):
+        """ Row indices of the recorded frames, oldest first. The row of the
+        current frame is still being written, so at most frames - 1 are kept.
+        """
+        count = min(self.frame, self.frames - 1)
+        first = self.frame - count
+        return [(first + i) % self.frames for i in range(count)]
+
+    def percentiles(self, phase, percentiles=PERCENTILES):
+        """ The given percentiles of a phase in seconds. """
+        index = self.phase_index[phase]
+        width = len(self.phases)
+        times = sorted(self.samples[row * width + index] for row in self.filled_rows())
+        if not times:
+            return [0.0] * len(percentiles)
+        return [times[min(len(times) - 1, len(times) * p // 100)] for p in percentiles]
+
+    def dump_csv(self, filename):
+        width = len(self.phases)
+        with open(filename, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["frame"] + self.phases)
+            rows = self.filled_rows()
+            first_frame = self.frame - len(rows)
+            for number, row in enumerate(rows):
+                writer.writerow([first_frame + number] +
+                                list(self.samples[row * width:(row + 1) * width]))
+
+
+class ProfilerHUD:
+    def __init__(self, profiler: FrameProfiler, x=10, y=10):
+        self.profiler = profiler
+        self.camera = arcade.camera.Camera2D()
+        self.screen_size = None
+        self.texts = [arcade.Text("", x, y + (len(profiler.phases) - i) * (HUD_FONT_SIZE + 6),
+                                  arcade.color.WHITE, HUD_FONT_SIZE)
+                      for i in range(len(profiler.phases) + 1)]
+        self.texts[0].text = "phase: p50 / p95 / p99 ms"
+
+    def refresh(self):
+        for phase, text in zip(self.profiler.phases, self.texts[1:]):
+            p50, p95, p99 = (t * 1000.0 for t in self.profiler.percentiles(phase))
+            text.text = f"{phase}: {p50:.2f} / {p95:.2f} / {p99:.2f}"
+
+    def draw(self, width, height):
+        if self.profiler.frame % HUD_REFRESH_FRAMES == 0:
+            self.refresh()
+
+        if self.screen_size != (width, height):
+            self.screen_size = (width, height)
+            self.camera.viewport = (0, 0, width, height)
+            self.camera.equalise()
+            self.camera.position = (width / 2, height / 2)
+
+        self.camera.use()
+        for text in self.texts:
+            text.draw()
@@ -0,0 +1,229 @@
+from collections import deque
+from contextlib import contextmanager
+
+import arcade
+from arcade.gl import geometry
+from pyglet import gl
+
+""" Offscreen rendering with dynamic resolution.
+
+Every camera can draw into its own ScaledViewport instead of straight into the
+window. The framebuffer behind it is allocated once at the full size of the
+camera's viewport, but only the bottom left render_size pixels of it are drawn
+to. The Blitter then stretches that part over the camera's viewport in the
+window with a single textured quad.
+
+A ResolutionController per viewport watches how long the GPU takes to draw
+that viewport and lowers the scale in steps when it takes longer than the
+target time, and raises it again once there is room. CPU time is no use here,
+a frame that is slow on the CPU does not get any faster at a lower resolution.
+Changing the scale never reallocates the framebuffer, so it can change as
+often as it needs to.
+
+The GPU times come from a GpuTimer. arcade's Query waits for its result as
+soon as it ends, which would stall the CPU until the GPU caught up every
+frame, so the GpuTimer keeps a few queries in flight and only reads the ones
+the GPU has finished, a frame or two later.
+"""
+
+DEFAULT_TARGET_FRAME_TIME = 1 / 60
+DEFAULT_MIN_SCALE = 0.5
+DEFAULT_MAX_SCALE = 1.0
+DEFAULT_SCALE_STEP = 0.05
+# Frame times are averaged, and after every change the scale is held for a
+# while so the average can catch up with it
+FRAME_TIME_SMOOTHING = 0.1
+SCALE_COOLDOWN_FRAMES = 30
+# Scale back up only when frames are comfortably under budget
+SCALE_UP_BUDGET = 0.8
+# How many frames of GPU time queries can be waiting to be read
+GPU_TIMER_QUERIES = 4
+
+BLIT_VERTEX_SHADER = """
+#version 330
+
+in vec2 in_vert;
+in vec2 in_uv;
+
+uniform vec2 uv_scale;
+
+out vec2 uv;
+
+void main() {
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+    uv = in_uv * uv_scale;
+}
+"""
+
+BLIT_FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D source;
+
+in vec2 uv;
+
+out vec4 fragColor;
+
+void main() {
+    fragColor = texture(source, uv);
+}
+"""
+
+
+class Blitter:
+    def __init__(self, ctx: arcade.ArcadeContext):
+        self.ctx = ctx
+        self.quad = geometry.quad_2d_fs()
+        self.program = ctx.program(vertex_shader=BLIT_VERTEX_SHADER,
+                                   fragment_shader=BLIT_FRAGMENT_SHADER)
+
+    def blit(self, texture, viewport, uv_scale=(1.0, 1.0)):
+        """ Stretch the bottom left uv_scale part of texture over viewport of
+        the active framebuffer.
+        """
+        self.ctx.viewport = viewport
+        texture.use(0)
+        self.program["uv_scale"] = uv_scale
+        self.quad.render(self.program)
+
+
+class GpuTimer:
+    def __init__(self, ctx: arcade.ArcadeContext, queries=GPU_TIMER_QUERIES):
+        # OpenGL ES has no timer queries, nothing is ever measured there
+        self.enabled = ctx.gl_api == "gl"
+        self.queries = (gl.GLuint * queries)()
+        if self.enabled:
+            gl.glGenQueries(queries, self.queries)
+        self.pending = deque()
+        self.next = 0
+
+    @contextmanager
+    def measure(self):
+        """ Time the GPU work issued inside. Skipped while every query is
+        still waiting to be read.
+        """
+        if not self.enabled or len(self.pending) == len(self.queries):
+            yield
+            return
+
+        query = self.queries[self.next]
+        self.next = (self.next + 1) % len(self.queries)
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, query)
+        try:
+            yield
+        finally:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self.pending.append(query)
+
+    def poll(self):
+        """ The times in seconds of the measurements the GPU finished since
+        the last poll, oldest first. Never waits.
+        """
+        times = []
+        available = gl.GLint()
+        elapsed = gl.GLuint64()
+        while self.pending:
+            gl.glGetQueryObjectiv(self.pending[0], gl.GL_QUERY_RESULT_AVAILABLE, available)
+            if not available.value:
+                break
+            gl.glGetQueryObjectui64v(self.pending.popleft(), gl.GL_QUERY_RESULT, elapsed)
+            times.append(elapsed.value / 1e9)
+        return times
+
+    def release(self):
+        """ Delete the queries, the timer measures nothing afterwards. """
+        if self.enabled:
+            gl.glDeleteQueries(len(self.queries), self.queries)
+        self.enabled = False
+        self.pending.clear()
+
+
+class ResolutionController:
+    def __init__(self,
+                 target_frame_time=DEFAULT_TARGET_FRAME_TIME,
+                 min_scale=DEFAULT_MIN_SCALE,
+                 max_scale=DEFAULT_MAX_SCALE,
+                 step=DEFAULT_SCALE_STEP):
+        self.target_frame_time = target_frame_time
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+
+        self.scale = max_scale
+        self.average = target_frame_time
+        self.cooldown = 0
+
+    def update(self, frame_time):
+        """ Feed the time the last frame took to draw, returns True if the scale changed. """
+        self.average += (frame_time - self.average) * FRAME_TIME_SMOOTHING
+        if self.cooldown:
+            self.cooldown -= 1
+            return False
+
+        scale = self.scale
+        if self.average > self.target_frame_time:
+            scale = max(self.min_scale, scale - self.step)
+        elif self.average < self.target_frame_time * SCALE_UP_BUDGET:
+            scale = min(self.max_scale, scale + self.step)
+
+        # Rounded so repeated steps land on the same scales
+        scale = round(scale, 4)
+        if scale == self.scale:
+            return False
+        self.scale = scale
+        self.cooldown = SCALE_COOLDOWN_FRAMES
+        return True
+
+
+class ScaledViewport:
+    def __init__(self, ctx: arcade.ArcadeContext,
+                 camera: arcade.camera.Camera2D,
+                 controller: ResolutionController = None):
+        self.ctx = ctx
+        self.camera = camera
+        self.controller = controller or ResolutionController()
+        self.timer = GpuTimer(ctx)
+        self.texture = None
+        self.framebuffer = None
+        self.render_size = (0, 0)
+
+    def allocate(self, width, height):
+        if self.texture is not None and self.texture.size == (width, height):
+            return
+        self.texture = self.ctx.texture((width, height),
+                                        filter=(self.ctx.LINEAR, self.ctx.LINEAR))
+        self.framebuffer = self.ctx.framebuffer(color_attachments=[self.texture])
+
+    @contextmanager
+    def activate(self, clear_color):
+        """ Draw into the framebuffer with the camera. The camera's viewport is
+        swapped for the scaled one while inside, so CameraRig.use and
+        BackgroundLayer.draw work unchanged.
+        """
+        viewport = tuple(self.camera.viewport)
+        width, height = max(int(viewport[2]), 1), max(int(viewport[3]), 1)
+        self.allocate(width, height)
+
+        scale = self.controller.scale
+        self.render_size = (max(round(width * scale), 1), max(round(height * scale), 1))
+        self.camera.viewport = (0, 0, *self.render_size)
+        try:
+            with self.framebuffer.activate(), self.timer.measure():
+                self.framebuffer.clear(color=clear_color, viewport=(0, 0, *self.render_size))
+                yield self
+        finally:
+            self.camera.viewport = viewport
+
+    def update_scale(self):
+        """ Feed the controller every GPU time measured since the last call. """
+        for gpu_time in self.timer.poll():
+            self.controller.update(gpu_time)
+
+    def release(self):
+        self.timer.release()
+
+    def blit(self, blitter: Blitter):
+        width, height = self.texture.size
+        blitter.blit(self.texture, tuple(self.camera.viewport),
+                     (self.render_size[0] / width, self.render_size[1] / height))
+
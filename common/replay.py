@@ -0,0 +1,105 @@
+import hashlib
+import struct
+import time
+from typing import NamedTuple
+
+""" Deterministic input recording and headless replay.
+
+Key presses and releases are recorded against the fixed timestep frame they
+happen on, into a compact binary file: a small header with the physics rate
+followed by one fixed size record per event.
+
+Replaying feeds those events back into the game's own key handlers and runs
+the game's fixed_update as fast as possible, without drawing. At the end the
+state of every physics body is hashed, so two replays of the same recording
+can be compared to prove the simulation is deterministic, and the steps per
+second give a repeatable benchmark of the update loop.
+"""
+
+MAGIC = b"ARPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<IBHI")
+
+KEY_PRESS = 0
+KEY_RELEASE = 1
+
+
+class InputEvent(NamedTuple):
+    frame: int
+    kind: int
+    modifiers: int
+    key: int
+
+
+class InputRecorder:
+    def __init__(self, filename, physics_rate):
+        self.filename = filename
+        self.physics_rate = physics_rate
+        self.data = bytearray(HEADER.pack(MAGIC, VERSION, physics_rate))
+
+    def record(self, frame, kind, key, modifiers):
+        self.data += RECORD.pack(frame, kind, modifiers, key)
+
+    def save(self):
+        with open(self.filename, "wb") as replay_file:
+            replay_file.write(self.data)
+
+
+def load_replay(filename):
+    """ The physics rate and the list of InputEvents of a recording. """
+    with open(filename, "rb") as replay_file:
+        data = replay_file.read()
+
+    magic, version, physics_rate = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{filename} is not a version {VERSION} replay file")
+
+    events = [InputEvent(*fields) for fields in RECORD.iter_unpack(data[HEADER.size:])]
+    return physics_rate, events
+
+
+def state_hash(bodies):
+    """ A hash of the position, velocity and angle of every body, in order. """
+    digest = hashlib.sha256()
+    for body in bodies:
+        digest.update(struct.pack("<6d",
+                                  body.position.x, body.position.y,
+                                  body.velocity.x, body.velocity.y,
+                                  body.angle, body.angular_velocity))
+    return digest.hexdigest()
+
+
+def run_replay(game, filename, frames=None):
+    """ Replay a recording through game.fixed_update without drawing.
+
+    Runs until the last recorded event, or for frames fixed steps. Returns the
+    number of steps, the steps per second and the final state hash.
+    """
+    physics_rate, events = load_replay(filename)
+    step_time = game.timestep.step_time
+    if round(1.0 / step_time) != physics_rate:
+        raise ValueError(f"{filename} was recorded at {physics_rate} Hz, "
+                         f"the game runs physics at {round(1.0 / step_time)} Hz")
+
+    if frames is None:
+        frames = events[-1].frame + 1 if events else 0
+
+    index = 0
+    start = time.perf_counter()
+    for frame in range(frames):
+        while index < len(events) and events[index].frame <= frame:
+            event = events[index]
+            if event.kind == KEY_PRESS:
+                game.on_key_press(event.key, event.modifiers)
+            else:
+                game.on_key_release(event.key, event.modifiers)
+            index += 1
+
+        game.fixed_update(step_time)
+        game.timestep.frame += 1
+    elapsed = time.perf_counter() - start
+
+    steps_per_second = frames / elapsed if elapsed > 0 else float("inf")
+    # Every body in the space, in the order they were added, swarm included
+    return frames, steps_per_second, state_hash(game.physics_engine.space.bodies)
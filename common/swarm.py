@@ -0,0 +1,167 @@
+import numpy as np
+import pymunk
+
+import arcade
+
+from common.timestep import per_step, per_step_factor
+
+""" Structure of arrays ship swarm for load scenes.
+
+Every Player keeps its input in its own attributes and updates its own body,
+which is fine for a couple of players and far too slow for thousands of ships.
+The ShipSwarm keeps thrust, rotation input and the physics state of all its
+ships in NumPy arrays instead. Damping, rotation and thrust are computed for
+every ship at once and written to the bodies in a single pass, and the sprite
+positions are interpolated in bulk and written back in a single pass.
+
+Pymunk has no batched body API, so the bodies are still touched one at a time,
+but only to read or write plain floats in one tight loop. The swarm adds its
+bodies to the Pymunk space itself, so the arcade physics engine does not also
+resync thousands of sprites every step.
+"""
+
+ANGLE_DAMPING = 1.05
+WANDER_AMOUNT = 0.1
+# Angular velocities smaller than this are stopped, so idle bodies can sleep
+ANGULAR_VELOCITY_EPSILON = 1e-4
+
+
+def turn_body(body, rotation, step_time):
+    """ Once per physics step, turn one body by rotation or damp it if that is 0.
+    The scalar version of ShipSwarm.apply_rotation, for the players.
+    """
+    if rotation:
+        body.angular_velocity += per_step(rotation, step_time)
+    # Stop touching the body once it stopped turning, so it can sleep
+    elif abs(body.angular_velocity) < ANGULAR_VELOCITY_EPSILON:
+        if body.angular_velocity:
+            body.angular_velocity = 0.0
+    else:
+        body.angular_velocity /= per_step_factor(ANGLE_DAMPING, step_time)
+
+
+class ShipSwarm:
+    def __init__(self, sprites: arcade.SpriteList,
+                 space: pymunk.Space,
+                 mass,
+                 thrust_force,
+                 rotation_force,
+                 collision_type=0,
+                 elasticity=0.0,
+                 friction=0.0,
+                 active=None,
+                 positions=None,
+                 size=None):
+        """ Without sprites, in a physics process, the ships are created from
+        positions and a (width, height) size instead.
+        """
+        self.sprites = sprites
+        self.space = space
+        self.mass = mass
+        self.thrust_force = thrust_force
+        self.rotation_force = rotation_force
+        self.collision_type = collision_type
+        self.elasticity = elasticity
+        self.friction = friction
+
+        self.count = 0
+        self.bodies = []
+        # Input, -1.0 to 1.0 per ship. Only active ships wander, the rest idle
+        self.thrust = np.zeros((0, 2))
+        self.rotation = np.zeros(0)
+        self.active = np.zeros(0, dtype=bool)
+        # x, y and sprite angle of the previous and current physics state
+        self.previous = np.zeros((0, 3))
+        self.current = np.zeros((0, 3))
+        # Where the sprites were last drawn
+        self.rendered = np.zeros((0, 3))
+
+        if sprites is not None:
+            positions = [sprite.position for sprite in sprites]
+            sizes = [(sprite.width, sprite.height) for sprite in sprites]
+        else:
+            sizes = [size] * len(positions)
+        self.add_ships(positions, sizes, active)
+
+    def add_ships(self, positions, sizes, active=None):
+        """ Add a body for every position and (width, height) size. A big swarm
+        can be added a batch at a time, their sprites have to be added to the
+        sprite list in the same order.
+        """
+        bodies = []
+        for (x, y), (width, height) in zip(positions, sizes):
+            body = pymunk.Body(self.mass, pymunk.moment_for_circle(self.mass, 0, width / 2))
+            body.position = x, y
+            shape = pymunk.Circle(body, min(width, height) / 2)
+            shape.collision_type = self.collision_type
+            shape.elasticity = self.elasticity
+            shape.friction = self.friction
+            self.space.add(body, shape)
+            bodies.append(body)
+
+        count = len(bodies)
+        state = self.read_state(bodies)
+        self.bodies.extend(bodies)
+        self.count += count
+        self.thrust = np.concatenate((self.thrust, np.zeros((count, 2))))
+        self.rotation = np.concatenate((self.rotation, np.zeros(count)))
+        self.active = np.concatenate((self.active,
+                                      np.ones(count, dtype=bool) if active is None else active))
+        self.previous = np.concatenate((self.previous, state))
+        self.current = np.concatenate((self.current, state))
+        self.rendered = np.concatenate((self.rendered, state))
+
+    def read_state(self, bodies=None):
+        bodies = self.bodies if bodies is None else bodies
+        state = np.fromiter((value for body in bodies
+                             for value in (body.position.x, body.position.y, body.angle)),
+                            dtype=np.float64, count=len(bodies) * 3).reshape(len(bodies), 3)
+        # Arcade angles are clockwise degrees, Pymunk's are counter clockwise radians
+        state[:, 2] = -np.degrees(state[:, 2])
+        return state
+
+    def wander(self, rng: np.random.Generator):
+        """ Simple AI, every active ship drifts its input around at random. """
+        thrust = self.thrust + rng.normal(0.0, WANDER_AMOUNT, self.thrust.shape)
+        rotation = self.rotation + rng.normal(0.0, WANDER_AMOUNT, self.count)
+        self.thrust = np.where(self.active[:, None], np.clip(thrust, -1.0, 1.0), 0.0)
+        self.rotation = np.where(self.active, np.clip(rotation, -1.0, 1.0), 0.0)
+
+    def apply_rotation(self, step_time):
+        """ Once per physics step, damp the ships that are not turning and turn the rest. """
+        current = np.fromiter((body.angular_velocity for body in self.bodies),
+                              dtype=np.float64, count=self.count)
+        angular_velocity = np.where(self.rotation == 0.0,
+                                    current / per_step_factor(ANGLE_DAMPING, step_time),
+                                    current + self.rotation * per_step(self.rotation_force, step_time))
+        angular_velocity[np.abs(angular_velocity) < ANGULAR_VELOCITY_EPSILON] = 0.0
+
+        # Only write the bodies that change, writing wakes sleeping bodies up
+        changed = np.flatnonzero(angular_velocity != current)
+        for index, value in zip(changed.tolist(), angular_velocity[changed].tolist()):
+            self.bodies[index].angular_velocity = value
+
+    def apply_thrust(self):
+        """ Every substep, Pymunk clears forces after each step. """
+        thrusting = np.flatnonzero(np.any(self.thrust != 0.0, axis=1))
+        forces = (self.thrust[thrusting] * self.thrust_force).tolist()
+        for index, force in zip(thrusting.tolist(), forces):
+            self.bodies[index].force = force
+
+    def save_state(self):
+        """ Call after every physics step. """
+        self.previous = self.current
+        self.current = self.read_state()
+
+    def shift(self, dx, dy):
+        """ Move the saved states, for when the world is rebased. """
+        self.previous[:, :2] += (dx, dy)
+        self.current[:, :2] += (dx, dy)
+        self.rendered[:, :2] += (dx, dy)
+
+    def sync_sprites(self, alpha):
+        """ Move the sprites to their interpolated render positions. """
+        self.rendered = self.previous + (self.current - self.previous) * alpha
+        for sprite, (x, y, angle) in zip(self.sprites, self.rendered.tolist()):
+            sprite.position = x, y
+            sprite.angle = angle
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+
+import arcade
+import PIL.Image
+
+""" Process wide texture and hit box cache.
+
+Tracing a hit box out of a sprite's pixels is the expensive part of loading a
+ship, and every Player used to decode its PNG and trace it again. Textures are
+shared here by (resource path, hit box algorithm, scale), so each one is loaded
+once per process.
+
+Traced hit boxes are also written to disk, keyed by a hash of the image file
+and the algorithm, so a cold start only traces images that changed since the
+last run.
+"""
+
+# Next to this module, so it is the same cache whatever directory the game is run from
+HIT_BOX_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                       ".hit_box_cache")
+
+_textures = {}
+_lock = threading.Lock()
+
+
+def algorithm_name(hit_box_algorithm):
+    return getattr(hit_box_algorithm, "cache_name", type(hit_box_algorithm).__name__)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as image_file:
+        for block in iter(lambda: image_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hit_box_cache_path(path, hit_box_algorithm):
+    name = f"{file_hash(path)}-{algorithm_name(hit_box_algorithm)}"
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    return os.path.join(HIT_BOX_CACHE_DIRECTORY, name + ".json")
+
+
+def load_hit_box(path, image, hit_box_algorithm):
+    """ The hit box of image, from the disk cache if the file has not changed. """
+    cache_path = hit_box_cache_path(path, hit_box_algorithm)
+    if os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            return tuple(tuple(point) for point in json.load(cache_file))
+
+    points = tuple(tuple(point) for point in hit_box_algorithm.calculate(image))
+
+    os.makedirs(HIT_BOX_CACHE_DIRECTORY, exist_ok=True)
+    tmp_path = cache_path + f".{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump(points, cache_file)
+    os.replace(tmp_path, cache_path)
+    return points
+
+
+def decode(resource, hit_box_algorithm):
+    """ Decode an image and find its hit box, without touching the GPU. """
+    path = arcade.resources.resolve(resource)
+    image = PIL.Image.open(path).convert("RGBA")
+    return image, load_hit_box(path, image, hit_box_algorithm)
+
+
+def create_texture(resource, image, points, hit_box_algorithm, scale=1.0):
+    """ Wrap a decoded image in a shared texture, returns the texture and its
+    hit box scaled by scale.
+    """
+    key = (resource, algorithm_name(hit_box_algorithm), scale)
+    with _lock:
+        if key not in _textures:
+            texture = arcade.Texture(image,
+                                     hit_box_points=points,
+                                     hash=f"{resource}|{algorithm_name(hit_box_algorithm)}")
+            scaled = tuple((x * scale, y * scale) for x, y in points)
+            _textures[key] = (texture, scaled)
+        return _textures[key]
+
+
+def load_texture(resource, hit_box_algorithm=None, scale=1.0):
+    """ The shared texture and scaled hit box for a resource. """
+    hit_box_algorithm = hit_box_algorithm or arcade.hitbox.algo_default
+    key = (resource, algorithm_name(hit_box_algorithm), scale)
+    with _lock:
+        cached = _textures.get(key)
+    if cached:
+        return cached
+
+    image, points = decode(resource, hit_box_algorithm)
+    return create_texture(resource, image, points, hit_box_algorithm, scale)
@@ -0,0 +1,109 @@
+""" Fixed timestep scheduling with render interpolation.
+
+Frames are turned into a whole number of fixed physics steps with an
+accumulator, so the simulation runs at the same rate whatever the display does.
+Each step can be split into substeps for a more stable solver. If the game
+falls too far behind the accumulator is clamped, dropping time instead of
+trying to catch up forever (the spiral of death).
+
+What is left in the accumulator is how far the render is between the last two
+physics states. The SpriteInterpolator uses that to draw sprites at a blend of
+their previous and current positions, and puts the real positions back before
+the next update.
+
+Forces are integrated by Pymunk over the real step time, but changes made
+straight to a body every step, such as angular damping and turning, are not.
+Those were tuned per step at TUNING_RATE, per_step and per_step_factor scale
+them to the actual step time so the ships handle the same at any rate.
+"""
+
+DEFAULT_PHYSICS_RATE = 60
+DEFAULT_SUBSTEPS = 1
+DEFAULT_MAX_STEPS = 5
+# The physics rate per step amounts were tuned at
+TUNING_RATE = 60
+
+
+def per_step(amount, step_time):
+    """ The change over step_time of amount, a change per step at TUNING_RATE. """
+    return amount * step_time * TUNING_RATE
+
+
+def per_step_factor(factor, step_time):
+    """ The multiplier over step_time of factor, a multiplier per step at TUNING_RATE. """
+    return factor ** (step_time * TUNING_RATE)
+
+
+class FixedTimestep:
+    def __init__(self, rate=DEFAULT_PHYSICS_RATE,
+                 substeps=DEFAULT_SUBSTEPS,
+                 max_steps=DEFAULT_MAX_STEPS):
+        self.step_time = 1.0 / rate
+        self.substeps = substeps
+        self.substep_time = self.step_time / substeps
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.frame = 0
+
+    @property
+    def alpha(self):
+        """ How far we are between the previous and the current physics state. """
+        return self.accumulator / self.step_time
+
+    def advance(self, delta_time, step):
+        """ Call step(step_time) as many times as delta_time covers. Returns
+        the number of steps taken.
+        """
+        self.accumulator = min(self.accumulator + delta_time,
+                               self.step_time * self.max_steps)
+
+        steps = 0
+        while self.accumulator >= self.step_time:
+            step(self.step_time)
+            self.accumulator -= self.step_time
+            self.frame += 1
+            steps += 1
+
+        return steps
+
+
+class SpriteInterpolator:
+    def __init__(self, sprites):
+        self.sprites = sprites
+        self.previous = {}
+        self.current = {}
+
+    @staticmethod
+    def state(sprite):
+        return sprite.center_x, sprite.center_y, sprite.angle
+
+    def save_previous(self):
+        """ Call before each physics step. """
+        self.previous = {sprite: self.state(sprite) for sprite in self.sprites}
+
+    def save_current(self):
+        """ Call after the physics steps of a frame. """
+        self.current = {sprite: self.state(sprite) for sprite in self.sprites}
+
+    def interpolate(self, alpha):
+        """ Move the sprites to their render positions. """
+        for sprite, (x, y, angle) in self.current.items():
+            previous = self.previous.get(sprite)
+            if previous is None:
+                continue
+            sprite.center_x = previous[0] + (x - previous[0]) * alpha
+            sprite.center_y = previous[1] + (y - previous[1]) * alpha
+            sprite.angle = previous[2] + (angle - previous[2]) * alpha
+
+    def shift(self, dx, dy):
+        """ Move the saved states, for when the world is rebased. """
+        for states in (self.previous, self.current):
+            for sprite, (x, y, angle) in states.items():
+                states[sprite] = (x + dx, y + dy, angle)
+
+    def restore(self):
+        """ Move the sprites back to their physics positions. """
+        for sprite, (x, y, angle) in self.current.items():
+            sprite.center_x = x
+            sprite.center_y = y
+            sprite.angle = angle
@@ -1,6 +1,26 @@
+import argparse
 from typing import Optional, Tuple
 
 import arcade
+import numpy as np
+
+from common.culling import CullingGrid, VisibleSet, camera_world_rect
+from common.background import BackgroundLayer
+from common.layout import SplitScreenLayout, ROW
+from common.camera_rig import CameraRig
+from common.timestep import FixedTimestep, SpriteInterpolator
+from common.input import InputManager
+from common import texture_cache
+from common.preloader import Asset, Preloader, LoadingScreen
+from common.profiling import FrameProfiler, ProfilerHUD
+from common.replay import InputRecorder, run_replay, KEY_PRESS, KEY_RELEASE
+from common.swarm import ShipSwarm, turn_body
+from common.floating_origin import FloatingOrigin
+from common.render_targets import Blitter, ResolutionController, ScaledViewport
+from common.minimap import Minimap
+from common.picking import Picker, SelectionBox, viewport_contains
+from common.physics_config import PhysicsConfig, StepTimer, configure_space, auto_cell_size
+from common.physics_process import PhysicsProcess, WorldSpec, SwarmSpec, body_spec
 
 """ A simple example that demonstrates using multiple cameras to allow a split 
 screen using Arcade's 3.0 camera.
@@ -23,6 +43,33 @@ BACKGROUND_IMAGE = ":resources:images/backgrounds/stars.png"
 
 DEFAULT_DAMPING = 1.0
 
+# Physics runs at a fixed rate, independent of the frame rate
+PHYSICS_RATE = 60
+PHYSICS_SUBSTEPS = 2
+MAX_PHYSICS_STEPS = 5
+
+# Spatial hash broadphase sized from the sprites, and idle ships fall asleep
+PHYSICS_CONFIG = PhysicsConfig(iterations=10,
+                               sleep_time_threshold=0.5,
+                               idle_speed_threshold=1.0,
+                               use_spatial_hash=True)
+
+# Every viewport is drawn offscreen, at a resolution that drops when the GPU
+# takes longer than TARGET_GPU_TIME to draw it and comes back once it is fast
+# again. Each viewport gets its share of a 60 fps frame. Off unless
+# --dynamic-resolution is given
+DYNAMIC_RESOLUTION = False
+TARGET_GPU_TIME = 1 / 60 / 2
+MIN_RENDER_SCALE = 0.5
+
+# F3 toggles frame timing and its HUD, F4 writes the timings to PROFILE_CSV.
+# The timings are also written on exit if profiling was on.
+PROFILE = False
+PROFILE_FRAMES = 600
+PROFILE_CSV = "frame_times.csv"
+PROFILE_TOGGLE_KEY = arcade.key.F3
+PROFILE_DUMP_KEY = arcade.key.F4
+
 GRAVITY = 0.0
 SHIP_MASS = 1.0
 SHIP_FRICTION = 0.0
@@ -34,6 +81,36 @@ KEYBOARD_THRUSTER_FORCE = 200.0
 KEYBOARD_ROTATION_FORCE = 0.05
 
 SHIP_SCALING = 0.5
+SHIP_HIT_BOX_ALGORITHM = arcade.hitbox.PymunkHitBoxAlgorithm()
+SHIP_SPRITE = ":resources:images/space_shooter/playerShip1_orange.png"
+
+# Swarm mode fills the world with AI ships, see --swarm
+SWARM_SPRITE = ":resources:images/space_shooter/playerShip2_orange.png"
+SWARM_SPREAD = 20000.0
+SWARM_SEED = 1
+# Ships created per frame while loading, so a big swarm does not freeze the window
+SWARM_BUILD_BATCH = 250
+# Only this fraction of the swarm flies around, the rest idles
+SWARM_ACTIVE_FRACTION = 0.1
+
+# The world is shifted back to the origin when player one gets this far from it
+REBASE_DISTANCE = 20000.0
+
+# Overview of the whole swarm in the top right corner, redrawn at most a few
+# times a second and only when a marker moved more than a couple of pixels
+MINIMAP = True
+MINIMAP_SIZE = (200, 200)
+MINIMAP_MARGIN = 10
+MINIMAP_WORLD_SIZE = (SWARM_SPREAD, SWARM_SPREAD)
+MINIMAP_REFRESH_RATE = 4.0
+MINIMAP_PLAYER_COLOR = arcade.color.WHITE
+MINIMAP_SWARM_COLOR = arcade.color.ORANGE
+
+# Left click picks a swarm ship, left drag box selects them. A release closer
+# to the press than this many pixels is a click
+CLICK_DISTANCE = 4
+SELECTED_COLOR = arcade.color.LIGHT_GREEN
+UNSELECTED_COLOR = arcade.color.WHITE
 
 PLAYER_ONE = 0
 PLAYER_TWO = 1
@@ -41,12 +118,22 @@ PLAYER_TWO = 1
 CAMERA_ONE = 0
 CAMERA_TWO = 1
 
+# Key -> (player, input field)
+KEYBOARD_BINDINGS = {
+    arcade.key.W: (PLAYER_ONE, "up"),
+    arcade.key.S: (PLAYER_ONE, "down"),
+    arcade.key.A: (PLAYER_ONE, "left"),
+    arcade.key.D: (PLAYER_ONE, "right"),
+    arcade.key.LEFT: (PLAYER_ONE, "rotate_left"),
+    arcade.key.RIGHT: (PLAYER_ONE, "rotate_right"),
+}
+
 
 class Player(arcade.Sprite):
     def __init__(self, main,
                  start_position: Tuple):
         self.shape = None
-        self.sprite_filename = ":resources:images/space_shooter/playerShip1_orange.png"
+        self.sprite_filename = SHIP_SPRITE
         self.main = main
         self.dx = 0.0
         self.dy = 0.0
@@ -56,173 +143,551 @@ class Player(arcade.Sprite):
         self.start_position = start_position
         self.friction = SHIP_FRICTION
 
-        self.w_pressed = 0.0
-        self.s_pressed = 0.0
-        self.a_pressed = 0.0
-        self.d_pressed = 0.0
-        self.left_pressed = 0.0
-        self.right_pressed = 0.0
+        self.input = None
 
-        super().__init__(self.sprite_filename)
+        # Every ship shares one texture and traced hit box
+        texture, _ = texture_cache.load_texture(self.sprite_filename,
+                                                hit_box_algorithm=SHIP_HIT_BOX_ALGORITHM,
+                                                scale=SHIP_SCALING)
+        super().__init__(texture, scale=SHIP_SCALING)
         self.position = start_position
         self.mass = SHIP_MASS
         self.friction = SHIP_FRICTION
         self.elasticity = SHIP_ELASTICITY
-        self.texture = arcade.load_texture(self.sprite_filename,
-                                           hit_box_algorithm=arcade.hitbox.PymunkHitBoxAlgorithm())
         self.main = main
-        self.scale = SHIP_SCALING
 
     def setup(self):
         self.body = self.main.physics_engine.get_physics_object(self).body
         self.shape = self.main.physics_engine.get_physics_object(self).shape
-        self.controller = arcade.get_controllers()[0]
-        self.controller.open()
-
-    def apply_angle_damping(self):
-        self.body.angular_velocity /= 1.05
 
     def on_update(self, delta_time: float):
         super().update()
 
-        self.dx = self.a_pressed + self.d_pressed
-        self.dy = self.w_pressed + self.s_pressed
-        self.applied_rotational_vel = self.left_pressed - self.right_pressed
-        
-        print(self.controller.lefty)
+        self.dx = self.input.thrust_x * KEYBOARD_THRUSTER_FORCE
+        self.dy = self.input.thrust_y * KEYBOARD_THRUSTER_FORCE
+        self.applied_rotational_vel = self.input.rotation * KEYBOARD_ROTATION_FORCE
 
-        if self.applied_rotational_vel == 0.0:
-            self.apply_angle_damping()
+        # In a physics process the worker turns the body
+        if self.body is None:
+            return
 
-        self.body.angular_velocity += self.applied_rotational_vel
-        self.body.apply_force_at_world_point((self.dx, -self.dy), (self.center_x, self.center_y))
+        # Called once per physics step, with the step time
+        turn_body(self.body, self.applied_rotational_vel, delta_time)
 
-    def on_key_press(self, key: int, modifiers: int):
-        if key == arcade.key.W:
-            self.w_pressed = -KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.S:
-            self.s_pressed = KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.A:
-            self.a_pressed = -KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.D:
-            self.d_pressed = KEYBOARD_THRUSTER_FORCE
-        elif key == arcade.key.LEFT:
-            self.left_pressed = KEYBOARD_ROTATION_FORCE
-        elif key == arcade.key.RIGHT:
-            self.right_pressed = KEYBOARD_ROTATION_FORCE
-
-    def on_key_release(self, key: int, modifiers: int):
-        if key == arcade.key.W:
-            self.w_pressed = 0.0
-        elif key == arcade.key.S:
-            self.s_pressed = 0.0
-        elif key == arcade.key.A:
-            self.a_pressed = 0.0
-        elif key == arcade.key.D:
-            self.d_pressed = 0.0
-        elif key == arcade.key.LEFT:
-            self.left_pressed = 0.0
-        elif key == arcade.key.RIGHT:
-            self.right_pressed = 0.0
+    def apply_thrust(self):
+        # Pymunk clears forces after every step, so this is applied each substep.
+        # The sprite is only resynced after the last substep, so use the body position
+        if self.dx or self.dy:
+            self.body.apply_force_at_world_point((self.dx, self.dy), self.body.position)
 
 
 class Game(arcade.Window):
-    def __init__(self):
+    def __init__(self, visible=True, swarm_size=0, physics_process=False,
+                 dynamic_resolution=DYNAMIC_RESOLUTION):
         self.screen_width = SCREEN_WIDTH
         self.screen_height = SCREEN_HEIGHT
+        # on_resize can fire while the window is being created
+        self.layout = None
         super().__init__(self.screen_width,
                          self.screen_height,
                          TITLE,
-                         resizable=True)
+                         resizable=True,
+                         visible=visible)
         arcade.set_background_color(BACKGROUND_COLOR)
         self.background_image = BACKGROUND_IMAGE
+        self.background_layer = None
         self.cameras = []
+        self.camera_rigs = []
+        self.frame_time = 0.0
+        self.culling_grid = None
+        self.visible_sets = []
         self.player_two_projection_data = None
-        self.player_two_viewport = None
         self.player_one_projection_data = None
-        self.player_one_viewport = None
         self.players_list = None
         self.physics_engine = None
+        self.timestep = None
+        self.interpolator = None
+        self.input = None
+        self.recorder = None
+        self.swarm_size = swarm_size
+        self.use_physics_process = physics_process
+        self.dynamic_resolution = dynamic_resolution
+        self.physics_process = None
+        self.swarm_sprites = None
+        self.swarm = None
+        self.swarm_rng = None
+        self.swarm_active = None
+        self.floating_origin = None
+        self.step_timer = StepTimer()
+        self.profiler = None
+        self.profiler_hud = None
+        self.camera_phases = []
+        self.blitter = None
+        self.render_targets = []
+        self.minimap = None
+        self.picker = None
+        self.selection_box = None
+        self.selected = None
+        self.drag_start = None
+        self.drag_end = None
         self.players: Optional[Player] = None
+        self.preloader = None
+        self.loading_screen = None
+        self.loading = True
 
     def on_key_press(self, key: int, modifiers: int):
-        for player in self.players:
-            player.on_key_press(key, modifiers)
+        if self.loading:
+            return
+        if self.recorder:
+            self.recorder.record(self.timestep.frame, KEY_PRESS, key, modifiers)
 
-    def on_key_release(self, key: int, modifers: int):
-        for player in self.players:
-            player.on_key_release(key, modifers)
+        if key == PROFILE_TOGGLE_KEY:
+            self.profiler.enabled = not self.profiler.enabled
+        elif key == PROFILE_DUMP_KEY:
+            self.profiler.dump_csv(PROFILE_CSV)
 
-    def setup(self):
+        self.input.on_key_press(key, modifiers)
+
+    def on_key_release(self, key: int, modifers: int):
+        if self.loading:
+            return
+        if self.recorder:
+            self.recorder.record(self.timestep.frame, KEY_RELEASE, key, modifers)
+
+        self.input.on_key_release(key, modifers)
+
+    def on_mouse_press(self, x: int, y: int, button: int, modifiers: int):
+        if self.loading or button != arcade.MOUSE_BUTTON_LEFT:
+            return
+        if self.minimap and viewport_contains(self.minimap_viewport(), x, y):
+            return
+        self.drag_start = self.drag_end = (x, y)
+
+    def on_mouse_drag(self, x: int, y: int, dx: int, dy: int, buttons: int, modifiers: int):
+        if self.drag_start:
+            self.drag_end = (x, y)
+
+    def on_mouse_release(self, x: int, y: int, button: int, modifiers: int):
+        if self.loading or button != arcade.MOUSE_BUTTON_LEFT or not self.drag_start:
+            return
+
+        start, self.drag_start = self.drag_start, None
+        if max(abs(x - start[0]), abs(y - start[1])) < CLICK_DISTANCE:
+            index = self.picker.pick(x, y)
+            self.select([] if index is None else [index])
+        else:
+            self.select(self.picker.box_select(start, (x, y)))
+
+    def select(self, indices):
+        """ Select the swarm ships at indices, only the ones that changed are recolored. """
+        selected = np.zeros(len(self.swarm_sprites), dtype=bool)
+        selected[indices] = True
+        for index in np.flatnonzero(selected != self.selected).tolist():
+            self.swarm_sprites[index].color = SELECTED_COLOR if selected[index] else UNSELECTED_COLOR
+        self.selected = selected
+
+    def setup(self, block=False):
+        """ Start loading the assets, the preloader then builds the world a
+        batch at a time. block loads everything right away, for headless runs.
+        """
+        self.preloader = Preloader(self.assets(), tasks=[self.setup_world()])
+        self.loading_screen = LoadingScreen(self.preloader)
+        if block:
+            self.preloader.wait()
+
+    def assets(self):
+        return [Asset(SHIP_SPRITE, SHIP_HIT_BOX_ALGORITHM, SHIP_SCALING),
+                Asset(SWARM_SPRITE, scale=SHIP_SCALING),
+                Asset(self.background_image, arcade.hitbox.algo_bounding_box)]
+
+    def setup_world(self):
+        """ A preloader task, yields how much of the swarm is built. """
         self.setup_spritelists()
         self.setup_physics_engine()
         self.setup_players()
+        yield from self.setup_swarm()
+        yield from self.setup_physics_process()
         self.setup_players_cameras()
-        self.background = arcade.load_texture(self.background_image)
+        self.setup_render_targets()
+        self.setup_minimap()
+        self.setup_culling()
+        self.setup_picking()
+        self.setup_profiler()
+        self.background, _ = texture_cache.load_texture(self.background_image,
+                                                        arcade.hitbox.algo_bounding_box)
+        self.background_layer = BackgroundLayer(self.background)
+        self.setup_floating_origin()
+        self.loading = False
 
     def setup_spritelists(self):
         self.players = arcade.SpriteList()
 
+    def setup_render_targets(self):
+        self.blitter = Blitter(self.ctx)
+        if not self.dynamic_resolution:
+            return
+        self.render_targets = [ScaledViewport(self.ctx, camera,
+                                              ResolutionController(TARGET_GPU_TIME,
+                                                                   MIN_RENDER_SCALE))
+                               for camera in self.cameras]
+
+    def setup_minimap(self):
+        if not MINIMAP:
+            return
+        self.minimap = Minimap(self.ctx, MINIMAP_WORLD_SIZE, MINIMAP_SIZE, MINIMAP_REFRESH_RATE)
+        self.minimap.add_layer(self.swarm_positions, MINIMAP_SWARM_COLOR)
+        self.minimap.add_layer(lambda: np.array([player.position for player in self.players]),
+                               MINIMAP_PLAYER_COLOR, marker_size=5.0)
+
+    def swarm_positions(self):
+        if self.physics_process:
+            return self.physics_process.positions(len(self.players))
+        return self.swarm.current[:, :2]
+
+    def rendered_swarm_positions(self):
+        if self.physics_process:
+            return self.physics_process.rendered[len(self.players):, :2]
+        return self.swarm.rendered[:, :2]
+
+    def minimap_viewport(self):
+        width, height = MINIMAP_SIZE
+        return (self.width - width - MINIMAP_MARGIN, self.height - height - MINIMAP_MARGIN,
+                width, height)
+
+    def setup_culling(self):
+        self.culling_grid = CullingGrid()
+        self.culling_grid.update_all(self.players)
+        self.culling_grid.update_all(self.swarm_sprites)
+        # The players are drawn over the swarm
+        self.visible_sets = [VisibleSet([self.swarm_sprites, self.players]) for _ in self.cameras]
+
+    def setup_picking(self):
+        # Clicks share the culling grid, which is kept up to date every frame.
+        # Only the swarm can be selected, never the players
+        self.picker = Picker(self.cameras, self.culling_grid, self.swarm_sprites,
+                             self.rendered_swarm_positions)
+        self.selected = np.zeros(len(self.swarm_sprites), dtype=bool)
+        self.selection_box = SelectionBox()
+
+    def setup_floating_origin(self):
+        if self.physics_process:
+            # The worker rebases the bodies, only the view has to follow it
+            self.floating_origin = FloatingOrigin(None, REBASE_DISTANCE)
+            self.floating_origin.add_listener(self.background_layer.shift)
+            for rig in self.camera_rigs:
+                self.floating_origin.add_listener(rig.shift)
+            return
+
+        self.floating_origin = FloatingOrigin(self.physics_engine.space, REBASE_DISTANCE)
+        self.floating_origin.add_sprite_list(self.players)
+        self.floating_origin.add_sprite_list(self.swarm_sprites)
+        self.floating_origin.add_listener(self.interpolator.shift)
+        self.floating_origin.add_listener(self.swarm.shift)
+        self.floating_origin.add_listener(self.background_layer.shift)
+        for rig in self.camera_rigs:
+            self.floating_origin.add_listener(rig.shift)
+
+    def setup_profiler(self):
+        self.camera_phases = [f"draw.camera_{camera}" for camera in range(len(self.cameras))]
+        phases = ["update.players", "update.physics", "draw.prepare", "draw.center_camera",
+                  "draw.minimap"]
+        self.profiler = FrameProfiler(phases + self.camera_phases, PROFILE_FRAMES, enabled=PROFILE)
+        self.profiler_hud = ProfilerHUD(self.profiler)
+
+    def on_close(self):
+        if self.profiler and self.profiler.enabled:
+            self.profiler.dump_csv(PROFILE_CSV)
+        if self.recorder:
+            self.recorder.save()
+        if self.physics_process:
+            if self.profiler and self.profiler.enabled:
+                print("Physics:", self.physics_process.summary())
+            self.physics_process.close()
+        elif self.profiler and self.profiler.enabled:
+            print("Physics:", self.step_timer.summary(self.physics_engine.space))
+        for target in self.render_targets:
+            target.release()
+        super().on_close()
+
     def setup_physics_engine(self):
         self.physics_engine = arcade.PymunkPhysicsEngine(damping=DEFAULT_DAMPING,
                                                          gravity=(0, 0))
+        self.timestep = FixedTimestep(PHYSICS_RATE, PHYSICS_SUBSTEPS, MAX_PHYSICS_STEPS)
+        self.interpolator = SpriteInterpolator(self.players)
 
     def setup_players(self):
         self.players.append(Player(self, (self.screen_width / 2.0, self.screen_height / 2.0)))
 
         self.players_list = [self.players[PLAYER_ONE]]
 
-        self.physics_engine.add_sprite(self.players[PLAYER_ONE],
-                                       friction=self.players[PLAYER_ONE].friction,
-                                       elasticity=self.players[PLAYER_ONE].elasticity,
-                                       mass=self.players[PLAYER_ONE].mass,
-                                       moment_of_inertia=arcade.PymunkPhysicsEngine.MOMENT_INF,
-                                       collision_type="SHIP")
+        self.input = InputManager(len(self.players), KEYBOARD_BINDINGS)
+        for player, player_input in zip(self.players, self.input.players):
+            player.input = player_input
+
+        if self.use_physics_process:
+            return
 
+        self.physics_engine.add_sprite_list(self.players,
+                                            friction=SHIP_FRICTION,
+                                            elasticity=SHIP_ELASTICITY,
+                                            mass=SHIP_MASS,
+                                            moment_of_inertia=arcade.PymunkPhysicsEngine.MOMENT_INF,
+                                            collision_type="SHIP")
         for player in self.players:
             player.setup()
 
-    def setup_players_cameras(self):
-        half_width = self.screen_width // 2
+    def setup_swarm(self):
+        self.swarm_sprites = arcade.SpriteList()
+        self.swarm_rng = np.random.default_rng(SWARM_SEED)
+        positions = self.swarm_rng.uniform(-SWARM_SPREAD / 2, SWARM_SPREAD / 2, (self.swarm_size, 2))
+        self.swarm_active = self.swarm_rng.random(self.swarm_size) < SWARM_ACTIVE_FRACTION
+        texture, _ = texture_cache.load_texture(SWARM_SPRITE, scale=SHIP_SCALING)
+
+        # The swarm starts empty and its ships are added a batch per frame
+        if not self.use_physics_process:
+            self.swarm = ShipSwarm(self.swarm_sprites,
+                                   self.physics_engine.space,
+                                   mass=SHIP_MASS,
+                                   thrust_force=KEYBOARD_THRUSTER_FORCE,
+                                   rotation_force=KEYBOARD_ROTATION_FORCE,
+                                   collision_type=self.physics_engine.collision_types.index("SHIP"),
+                                   elasticity=SHIP_ELASTICITY,
+                                   friction=SHIP_FRICTION)
+
+        for start in range(0, self.swarm_size, SWARM_BUILD_BATCH):
+            batch = slice(start, start + SWARM_BUILD_BATCH)
+            sprites = []
+            for x, y in positions[batch].tolist():
+                sprite = arcade.Sprite(texture, scale=SHIP_SCALING)
+                sprite.position = (self.screen_width / 2.0 + x, self.screen_height / 2.0 + y)
+                sprites.append(sprite)
+            self.swarm_sprites.extend(sprites)
+            if not self.use_physics_process:
+                self.swarm.add_ships([sprite.position for sprite in sprites],
+                                     [(sprite.width, sprite.height) for sprite in sprites],
+                                     self.swarm_active[batch])
+            yield min(start + SWARM_BUILD_BATCH, self.swarm_size) / self.swarm_size
+
+        if self.use_physics_process:
+            return
+
+        # Once every body is in the space the broadphase can be sized from them
+        configure_space(self.physics_engine.space, PHYSICS_CONFIG, [self.players, self.swarm_sprites])
+
+    def setup_physics_process(self):
+        """ Hand the world to a worker process, built from the same sprites and
+        settings as the in process physics.
+        """
+        if not self.use_physics_process:
+            return
+
+        swarm = None
+        if len(self.swarm_sprites):
+            first = self.swarm_sprites[0]
+            swarm = SwarmSpec(positions=np.array([sprite.position for sprite in self.swarm_sprites]),
+                              size=(first.width, first.height),
+                              active=self.swarm_active,
+                              seed=SWARM_SEED,
+                              mass=SHIP_MASS,
+                              thrust_force=KEYBOARD_THRUSTER_FORCE,
+                              rotation_force=KEYBOARD_ROTATION_FORCE,
+                              elasticity=SHIP_ELASTICITY,
+                              friction=SHIP_FRICTION)
+
+        cell_size = PHYSICS_CONFIG.cell_size or auto_cell_size([self.players, self.swarm_sprites])
+        world = WorldSpec(rate=PHYSICS_RATE,
+                          substeps=PHYSICS_SUBSTEPS,
+                          max_steps=MAX_PHYSICS_STEPS,
+                          damping=DEFAULT_DAMPING,
+                          config=PHYSICS_CONFIG._replace(cell_size=cell_size),
+                          players=tuple(body_spec(player, SHIP_MASS,
+                                                  arcade.PymunkPhysicsEngine.MOMENT_INF,
+                                                  SHIP_FRICTION, SHIP_ELASTICITY)
+                                        for player in self.players),
+                          swarm=swarm,
+                          rebase_distance=REBASE_DISTANCE)
+        self.physics_process = PhysicsProcess(world)
+        # The worker builds its own bodies, the loading screen keeps drawing meanwhile
+        for _ in self.physics_process.starting():
+            yield 1.0
 
-        # Viewport is defined as: (left, bottom, width, height)
-        self.player_one_viewport = (0, 0, half_width, self.screen_height)
-        self.player_two_viewport = (half_width, 0, half_width, self.screen_height)
+    def setup_players_cameras(self):
+        self.cameras.append(arcade.camera.Camera2D())
+        self.cameras.append(arcade.camera.Camera2D())
+
+        # The layout sets each camera's viewport, (left, bottom, width, height),
+        # side by side and keeps them fitted to the window when it is resized
+        self.layout = SplitScreenLayout(self.cameras, ROW)
+        self.layout.apply(self.screen_width, self.screen_height)
+
+        # The rigs only rebuild and upload a camera's matrices when it changes
+        self.camera_rigs = [CameraRig(camera) for camera in self.cameras]
+        self.camera_rigs[PLAYER_ONE].snap_to(self.players_list[PLAYER_ONE].center_x,
+                                             self.players_list[PLAYER_ONE].center_y)
+
+    def on_resize(self, width: int, height: int):
+        super().on_resize(width, height)
+        self.screen_width = width
+        self.screen_height = height
+        if self.layout:
+            self.layout.on_resize(width, height)
 
-        player_one_camera = arcade.camera.Camera2D()
-        player_one_camera.viewport = self.player_one_viewport
-        player_one_camera.equalise()
+    def center_camera_on_player(self, player_num):
+        self.camera_rigs[player_num].follow(self.players_list[player_num].center_x,
+                                            self.players_list[player_num].center_y,
+                                            self.frame_time)
 
-        player_two_camera = arcade.camera.Camera2D()
-        player_two_camera.viewport = self.player_two_viewport
-        player_two_camera.equalise()
+    def fixed_update(self, delta_time: float):
+        self.interpolator.save_previous()
+        self.profiler.begin("update.players")
+        self.players.on_update(delta_time)
+        self.swarm.wander(self.swarm_rng)
+        self.swarm.apply_rotation(delta_time)
+        self.profiler.end("update.players")
+
+        self.profiler.begin("update.physics")
+        for substep in range(self.timestep.substeps):
+            for player in self.players:
+                player.apply_thrust()
+            self.swarm.apply_thrust()
+            self.step_timer.step(self.physics_engine, self.timestep.substep_time,
+                                 resync_sprites=substep == self.timestep.substeps - 1)
+        self.swarm.save_state()
+        self.profiler.end("update.physics")
+
+        position = self.players_list[PLAYER_ONE].body.position
+        self.floating_origin.check(position.x, position.y)
 
-        self.cameras.append(player_one_camera)
-        self.cameras.append(player_two_camera)
+    def on_update(self, delta_time: float):
+        if self.loading:
+            self.preloader.upload()
+            return
+
+        self.frame_time = delta_time
+        if self.layout.update():
+            for rig in self.camera_rigs:
+                rig.mark_dirty()
+
+        if self.physics_process:
+            self.profiler.begin("update.players")
+            for index, player in enumerate(self.players):
+                player.on_update(delta_time)
+                self.physics_process.send_input(index, player.dx, player.dy,
+                                                player.applied_rotational_vel)
+            self.profiler.end("update.players")
+            return
+
+        self.interpolator.restore()
+        if self.timestep.advance(delta_time, self.fixed_update):
+            self.interpolator.save_current()
+
+    def sync_physics_process(self):
+        """ Move the sprites to the latest snapshot, and follow the worker when
+        it rebased the world.
+        """
+        origin = self.physics_process.sync([self.players, self.swarm_sprites])
+        current = self.floating_origin.origin
+        if origin != current:
+            self.floating_origin.rebase(origin[0] - current[0], origin[1] - current[1])
 
+    def on_draw(self):
+        if self.loading:
+            self.clear()
+            self.loading_screen.draw(self.width, self.height)
+            return
+
+        # Draw between the last two physics states so the sprites move smoothly
+        # whatever the ratio of physics rate to frame rate
+        self.profiler.begin("draw.prepare")
+        if self.physics_process:
+            self.sync_physics_process()
+        else:
+            self.interpolator.interpolate(self.timestep.alpha)
+            self.swarm.sync_sprites(self.timestep.alpha)
+        self.culling_grid.update_all(self.players)
+        self.culling_grid.update_moved(self.swarm_sprites, self.rendered_swarm_positions())
+        self.profiler.end("draw.prepare")
+
+        self.profiler.begin("draw.center_camera")
         self.center_camera_on_player(PLAYER_ONE)
+        self.profiler.end("draw.center_camera")
 
-    def center_camera_on_player(self, player_num):
-        self.cameras[player_num].position = (self.players_list[player_num].center_x,
-                                             self.players_list[player_num].center_y)
+        # Streamed after the camera moved, so the tiles match this frame
+        self.profiler.begin("draw.prepare")
+        self.background_layer.stream(self.cameras)
+        self.profiler.end("draw.prepare")
 
-    def on_update(self, delta_time: float):
-        self.players.on_update(delta_time)
-        self.physics_engine.step()
-        self.center_camera_on_player(PLAYER_ONE)
-
-    def on_draw(self):
+        if self.render_targets:
+            self.clear()
         for camera in range(len(self.cameras)):
-            self.cameras[camera].use()
+            phase = self.camera_phases[camera]
+            self.profiler.begin(phase)
+            if self.render_targets:
+                target = self.render_targets[camera]
+                with target.activate(BACKGROUND_COLOR):
+                    self.draw_camera(camera)
+                target.blit(self.blitter)
+            else:
+                self.draw_camera(camera)
+            self.profiler.end(phase)
+
+        if self.minimap:
+            self.profiler.begin("draw.minimap")
+            self.minimap.update(self.frame_time, self.players_list[PLAYER_ONE].position)
+            self.minimap.draw(self.blitter, self.minimap_viewport())
+            self.profiler.end("draw.minimap")
+
+        if self.drag_start and self.drag_end != self.drag_start:
+            self.selection_box.draw(self.drag_start, self.drag_end, self.width, self.height)
+
+        if self.profiler.enabled:
+            self.profiler_hud.draw(self.width, self.height)
+        self.profiler.end_frame()
+
+        for target in self.render_targets:
+            target.update_scale()
+
+    def draw_camera(self, camera):
+        self.camera_rigs[camera].use()
+        if not self.render_targets:
             self.clear()
-            arcade.draw_lrwh_rectangle_textured(0, 0,
-                                                self.screen_width, self.screen_height,
-                                                self.background)
-            self.players.draw()
+        self.background_layer.draw(self.cameras[camera], self.camera_rigs[camera])
 
+        # Only draw the sprites this camera can actually see
+        visible = self.culling_grid.query(camera_world_rect(self.cameras[camera]))
+        self.visible_sets[camera].update(visible)
+        self.visible_sets[camera].draw()
 
 
 if __name__ == "__main__":
-    window = Game()
-    window.setup()
-    arcade.run()
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument("--record", metavar="FILE",
+                        help="record key presses to FILE while playing")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay FILE headless as fast as possible and report the result")
+    parser.add_argument("--frames", type=int,
+                        help="number of physics steps to replay, defaults to the last recorded event")
+    parser.add_argument("--swarm", type=int, default=0, metavar="N",
+                        help="add N AI controlled ships to the world")
+    parser.add_argument("--physics-process", action="store_true",
+                        help="run the physics in a separate process")
+    parser.add_argument("--dynamic-resolution", action="store_true",
+                        help="draw every viewport offscreen and lower its resolution when the GPU falls behind")
+    args = parser.parse_args()
+    if args.physics_process and (args.record or args.replay):
+        parser.error("--physics-process can not be recorded or replayed, it is not deterministic")
+
+    if args.replay:
+        window = Game(visible=False, swarm_size=args.swarm)
+        window.setup(block=True)
+        steps, steps_per_second, digest = run_replay(window, args.replay, args.frames)
+        print(f"Replayed {steps} steps at {steps_per_second:.1f} steps/s")
+        print(f"Final state hash: {digest}")
+        print("Physics:", window.step_timer.summary(window.physics_engine.space))
+    else:
+        window = Game(swarm_size=args.swarm, physics_process=args.physics_process,
+                      dynamic_resolution=args.dynamic_resolution)
+        window.setup()
+        if args.record:
+            window.recorder = InputRecorder(args.record, PHYSICS_RATE)
+        arcade.run()